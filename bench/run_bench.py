@@ -0,0 +1,276 @@
+# file: bench/run_bench.py
+#
+# Starts the upstream stub and the API (both under uvicorn, on local ports), drives each hot
+# endpoint with concurrent load and reports p50/p99 latency and throughput per scenario.
+# The run fails (exit code 1) when a scenario's p50 or p99 exceeds its stored baseline by more
+# than the tolerance factor, or when its throughput drops below baseline / tolerance.
+#
+#   python bench/run_bench.py                      # compare against bench/baselines.json
+#   python bench/run_bench.py --update-baselines   # record this run as the new baselines
+#   python bench/run_bench.py --players 20000 --listings 20000 --concurrency 32 --only players_owned
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+BASELINES_PATH = os.path.join(BENCH_DIR, "baselines.json")
+
+# --- Processes ---
+def start_server(app: str, port: int, cwd: str, env: Dict[str, str], app_dir: Optional[str] = None) -> subprocess.Popen:
+    cmd = [sys.executable, "-m", "uvicorn", app, "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+    if app_dir:
+        cmd += ["--app-dir", app_dir]
+    return subprocess.Popen(cmd, cwd=cwd, env={**os.environ, **env})
+
+def wait_until_ready(url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=2).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+def stop_server(proc: subprocess.Popen):
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+# --- Load Generation ---
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+async def run_scenario(client: httpx.AsyncClient, make_request: Callable, requests: int, concurrency: int, warmup: int) -> Dict[str, Any]:
+    for n in range(warmup):
+        response = await make_request(client, n)
+        response.raise_for_status()
+
+    latencies: List[float] = []
+    errors = 0
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one(n: int):
+        nonlocal errors
+        async with slots:
+            started = time.perf_counter()
+            try:
+                response = await make_request(client, n)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(n) for n in range(requests)))
+    wall = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+        "throughput_rps": round(requests / wall, 1) if wall > 0 else 0.0,
+    }
+
+def build_scenarios(owned_ids: List[int], market_ids: List[int], formations: Dict[str, Dict[str, str]], roles: List[Dict], seed: int) -> Dict[str, Callable]:
+    rng = random.Random(seed)
+    roles_by_position: Dict[str, List[str]] = {}
+    for role in roles:
+        roles_by_position.setdefault((role.get("Position") or "").strip().upper(), []).append(role["Role"])
+    formation = formations[sorted(formations)[0]]
+    role_map = {slot: roles_by_position[pos][0] for slot, pos in formation.items() if pos in roles_by_position}
+    squad_ids = rng.sample(owned_ids, min(200, len(owned_ids)))
+    striker_role = roles_by_position.get("ST", [roles[0]["Role"]])[0]
+    club_names = ["Bench A", "Bench B", "Bench C"]
+
+    async def players_owned(client, n):
+        return await client.get("/players/owned")
+
+    async def players_owned_cold(client, n):
+        await client.post("/cache/owned/invalidate")
+        return await client.get("/players/owned")
+
+    async def players_by_ids(client, n):
+        return await client.post("/players/by_ids", json={"player_ids": rng.sample(owned_ids, min(30, len(owned_ids)))})
+
+    async def simulate_greedy(client, n):
+        return await client.post("/squads/simulate", json={"player_ids": squad_ids, "role_map": role_map, "tier": "Iron"})
+
+    async def simulate_optimal(client, n):
+        return await client.post("/squads/simulate", json={"player_ids": squad_ids, "role_map": role_map, "tier": "Iron", "solver": "optimal"})
+
+    async def market_search(client, n):
+        return await client.post("/market/search", json={"role_name": striker_role, "auth_token": "bench", "tier": "Iron"})
+
+    async def market_deep(client, n):
+        return await client.post("/market/search/deep", json={"role_name": striker_role, "auth_token": "bench", "tier": "Gold", "top_n": 20, "max_pages": 10})
+
+    async def market_scan(client, n):
+        targets = [{"role_name": role_name, "tier": "Iron", "limit": 5} for role_name in role_map.values()]
+        return await client.post("/market/scan", json={"auth_token": "bench", "targets": targets, "max_pages": 10})
+
+    async def role_analysis(client, n):
+        return await client.get(f"/player/{rng.choice(market_ids)}/role-analysis")
+
+    async def role_analysis_batch(client, n):
+        return await client.post("/players/role-analysis/batch", json={"player_ids": rng.sample(owned_ids, min(50, len(owned_ids)))})
+
+    async def formations_recommend(client, n):
+        return await client.post("/formations/recommend", json={"tier": "Iron", "include_squads": n % 2 == 0})
+
+    async def clubs_read(client, n):
+        return await client.get("/clubs")
+
+    async def clubs_assign(client, n):
+        return await client.post("/players/assign", json={"player_id": rng.choice(owned_ids), "old_club_name": "Unassigned", "new_club_name": rng.choice(club_names)})
+
+    async def clubs_bulk(client, n):
+        operations = [{"op": "assign", "player_id": pid, "club_name": rng.choice(club_names + ["Unassigned"])} for pid in rng.sample(owned_ids, min(200, len(owned_ids)))]
+        return await client.post("/clubs/bulk", json={"operations": operations})
+
+    return {
+        "players_owned": players_owned,
+        "players_owned_cold": players_owned_cold,
+        "players_by_ids": players_by_ids,
+        "simulate_greedy": simulate_greedy,
+        "simulate_optimal": simulate_optimal,
+        "market_search": market_search,
+        "market_deep": market_deep,
+        "market_scan": market_scan,
+        "role_analysis": role_analysis,
+        "role_analysis_batch": role_analysis_batch,
+        "formations_recommend": formations_recommend,
+        "clubs_read": clubs_read,
+        "clubs_assign": clubs_assign,
+        "clubs_bulk": clubs_bulk,
+    }
+
+# Scenarios that refetch the whole roster or page through the market run with fewer requests.
+REQUEST_SCALE = {"players_owned_cold": 0.1, "market_deep": 0.25, "market_scan": 0.25}
+
+async def run_all(args, api_url: str) -> Dict[str, Dict[str, Any]]:
+    with open(os.path.join(REPO_DIR, "formations.json"), "r", encoding="utf-8") as f: formations = json.load(f)
+    with open(os.path.join(REPO_DIR, "roles.json"), "r", encoding="utf-8") as f: roles = json.load(f)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=api_url, timeout=120, limits=limits) as client:
+        for club_name in ["Bench A", "Bench B", "Bench C"]:
+            await client.post("/clubs", json={"club_name": club_name, "tier": "Iron", "roster": []})
+        owned = (await client.get("/players/owned")).json()
+        owned_ids = [p["id"] for p in owned]
+        market_ids = list(range(10000 + args.owned, 10000 + args.players))
+        scenarios = build_scenarios(owned_ids, market_ids, formations, roles, args.seed)
+        results = {}
+        for name, make_request in scenarios.items():
+            if args.only and name not in args.only:
+                continue
+            requests = max(args.concurrency, int(args.requests * REQUEST_SCALE.get(name, 1)))
+            results[name] = await run_scenario(client, make_request, requests, args.concurrency, args.warmup)
+            print(f"{name:<22} p50 {results[name]['p50_ms']:>9.2f} ms   p99 {results[name]['p99_ms']:>9.2f} ms   "
+                  f"{results[name]['throughput_rps']:>8.1f} req/s   errors {results[name]['errors']}", flush=True)
+        return results
+
+# --- Baselines ---
+def check_baselines(results: Dict[str, Dict[str, Any]], baselines: Dict[str, Dict[str, Any]], tolerance: float) -> List[str]:
+    failures = []
+    for name, result in results.items():
+        if result["errors"]:
+            failures.append(f"{name}: {result['errors']} failed requests")
+        baseline = baselines.get(name)
+        if not baseline:
+            continue
+        for metric in ("p50_ms", "p99_ms"):
+            if result[metric] > baseline[metric] * tolerance:
+                failures.append(f"{name}: {metric} {result[metric]} exceeds baseline {baseline[metric]} x {tolerance}")
+        if result["throughput_rps"] < baseline["throughput_rps"] / tolerance:
+            failures.append(f"{name}: throughput {result['throughput_rps']} below baseline {baseline['throughput_rps']} / {tolerance}")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the API against a local upstream stub.")
+    parser.add_argument("--players", type=int, default=10000)
+    parser.add_argument("--owned", type=int, default=1500)
+    parser.add_argument("--listings", type=int, default=10000)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--only", nargs="*", help="run only these scenarios")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="allowed factor over baseline")
+    parser.add_argument("--stub-port", type=int, default=8900)
+    parser.add_argument("--api-port", type=int, default=8901)
+    parser.add_argument("--update-baselines", action="store_true")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="mfl-bench-")
+    stub_env = {
+        "STUB_PLAYERS": str(args.players), "STUB_OWNED": str(args.owned), "STUB_LISTINGS": str(args.listings),
+        "STUB_LATENCY_MS": str(args.latency_ms), "STUB_SEED": str(args.seed),
+    }
+    api_env = {
+        "MFL_API_BASE": f"http://127.0.0.1:{args.stub_port}",
+        "OWNED_PLAYERS_LIMIT": str(args.owned),
+        "SQUADS_DB_PATH": os.path.join(workdir, "squads.db"),
+        "EVENTS_POLL_INTERVAL": "0",
+    }
+    stub = start_server("stub_upstream:app", args.stub_port, REPO_DIR, stub_env, app_dir=BENCH_DIR)
+    api = None
+    try:
+        wait_until_ready(f"http://127.0.0.1:{args.stub_port}/events")
+        api = start_server("main:app", args.api_port, REPO_DIR, api_env)
+        wait_until_ready(f"http://127.0.0.1:{args.api_port}/tiers")
+        results = asyncio.run(run_all(args, f"http://127.0.0.1:{args.api_port}"))
+    finally:
+        if api is not None:
+            stop_server(api)
+        stop_server(stub)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
+    if args.update_baselines:
+        # Scenarios left out with --only keep their stored baselines
+        try:
+            with open(BASELINES_PATH, "r", encoding="utf-8") as f: baselines = json.load(f)
+        except FileNotFoundError:
+            baselines = {}
+        baselines.update({name: {k: r[k] for k in ("p50_ms", "p99_ms", "throughput_rps")} for name, r in results.items()})
+        with open(BASELINES_PATH, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, indent=4)
+        print(f"Baselines written to {BASELINES_PATH}")
+        return 0
+
+    try:
+        with open(BASELINES_PATH, "r", encoding="utf-8") as f: baselines = json.load(f)
+    except FileNotFoundError:
+        print("No baselines stored yet; run with --update-baselines to record them.")
+        return 0
+    failures = check_baselines(results, baselines, args.tolerance)
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+# file: bench/stub_upstream.py
+#
+# Local stand-in for the players, listings and events APIs that main.py talks to, backed by
+# deterministic synthetic data. Sized and tuned through environment variables:
+#   STUB_PLAYERS        players in the universe (default 10000)
+#   STUB_OWNED          how many of them belong to OWNER_WALLET (default 1500)
+#   STUB_LISTINGS       marketplace listings (default 10000)
+#   STUB_EVENTS         events in the feed (default 500)
+#   STUB_LATENCY_MS     added to every response, to mimic the real upstream (default 20)
+#   STUB_SEED           RNG seed (default 7)
+# Run with:  uvicorn stub_upstream:app --app-dir bench --port 8900
+
+import asyncio
+import json
+import os
+import random
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI, HTTPException, Request
+
+OWNER_WALLET = "0x5d4143c95673cba6"
+ATTRIBUTES = ["pace", "shooting", "passing", "dribbling", "defense", "physical", "goalkeeping"]
+NATIONALITIES = ["ENGLAND", "BRAZIL", "ARGENTINA", "FRANCE", "GERMANY", "SPAIN", "PORTUGAL", "NETHERLANDS", "ITALY", "SAUDI_ARABIA"]
+ROLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "roles.json")
+
+STUB_PLAYERS = int(os.getenv("STUB_PLAYERS", "10000"))
+STUB_OWNED = int(os.getenv("STUB_OWNED", "1500"))
+STUB_LISTINGS = int(os.getenv("STUB_LISTINGS", "10000"))
+STUB_EVENTS = int(os.getenv("STUB_EVENTS", "500"))
+STUB_LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "20"))
+STUB_SEED = int(os.getenv("STUB_SEED", "7"))
+
+# --- Synthetic Data ---
+def role_positions() -> List[str]:
+    with open(ROLES_PATH, "r", encoding="utf-8") as f:
+        return sorted({(r.get("Position") or "").strip().upper() for r in json.load(f)} - {""})
+
+def generate_players(count: int, owned: int, seed: int) -> List[Dict]:
+    rng = random.Random(seed)
+    positions = role_positions()
+    players = []
+    for n in range(count):
+        player_id = 10000 + n
+        is_keeper = rng.random() < 0.08
+        player_positions = ["GK"] if is_keeper else rng.sample([p for p in positions if p != "GK"], rng.randint(1, 3))
+        attrs = {attr: rng.randint(35, 95) for attr in ATTRIBUTES}
+        attrs["goalkeeping"] = rng.randint(60, 95) if is_keeper else rng.randint(5, 30)
+        players.append({
+            "id": player_id,
+            "ownedBy": {"walletAddress": OWNER_WALLET if n < owned else f"0x{rng.getrandbits(64):016x}"},
+            "metadata": {
+                "firstName": f"First{n}",
+                "lastName": f"Last{n}",
+                "age": rng.randint(17, 36),
+                "overall": round(sum(attrs.values()) / len(attrs)),
+                "positions": player_positions,
+                "nationalities": [rng.choice(NATIONALITIES)],
+                **attrs,
+            },
+            "activeContract": {"id": player_id * 10, "status": "ACTIVE", "revenueShare": rng.randint(0, 2000)},
+        })
+    return players
+
+def generate_listings(players: List[Dict], count: int, seed: int) -> List[Dict]:
+    rng = random.Random(seed + 1)
+    for_sale = [p for p in players if p["ownedBy"]["walletAddress"] != OWNER_WALLET] or players
+    listings = []
+    for n in range(count):
+        player = for_sale[n % len(for_sale)]
+        listings.append({
+            "listingResourceId": 500000 + n,
+            "status": "AVAILABLE",
+            "price": rng.randint(1, 2000),
+            "player": player,
+            "sellerAddress": player["ownedBy"]["walletAddress"],
+            "sellerName": f"Seller{n % 97}",
+            "createdDateTime": 1700000000000 + n * 1000,
+        })
+    return listings
+
+def generate_events(players: List[Dict], listings: List[Dict], count: int, seed: int) -> List[Dict]:
+    rng = random.Random(seed + 2)
+    types = ["LISTING_CREATED", "LISTING_CANCELLED", "LISTING_SOLD", "PLAYER_PROGRESSION", "CONTRACT_UPDATED"]
+    events = []
+    for n in range(count):
+        event_type = rng.choice(types)
+        if event_type.startswith("LISTING"):
+            listing = rng.choice(listings)
+            events.append({"id": n + 1, "type": event_type, "listing": {"listingResourceId": listing["listingResourceId"], "player": {"id": listing["player"]["id"]}}})
+        else:
+            events.append({"id": n + 1, "type": event_type, "playerId": rng.choice(players)["id"]})
+    return events
+
+PLAYERS = generate_players(STUB_PLAYERS, STUB_OWNED, STUB_SEED)
+PLAYERS_BY_ID = {p["id"]: p for p in PLAYERS}
+LISTINGS = generate_listings(PLAYERS, STUB_LISTINGS, STUB_SEED)
+EVENTS = generate_events(PLAYERS, LISTINGS, STUB_EVENTS, STUB_SEED)
+
+app = FastAPI()
+
+async def simulate_latency():
+    if STUB_LATENCY_MS > 0:
+        await asyncio.sleep(STUB_LATENCY_MS / 1000)
+
+def int_param(request: Request, name: str, default: Optional[int] = None) -> Optional[int]:
+    value = request.query_params.get(name)
+    return int(value) if value not in (None, "") else default
+
+# --- Endpoints ---
+@app.get("/players")
+async def list_players(request: Request):
+    await simulate_latency()
+    limit = int_param(request, "limit", 25)
+    owner = request.query_params.get("ownerWalletAddress")
+    players = [p for p in PLAYERS if p["ownedBy"]["walletAddress"] == owner] if owner else PLAYERS
+    return players[:limit]
+
+@app.get("/players/{player_id}")
+async def get_player(player_id: int):
+    await simulate_latency()
+    player = PLAYERS_BY_ID.get(player_id)
+    if player is None:
+        raise HTTPException(status_code=404, detail="Player not found")
+    return {"player": player}
+
+@app.get("/listings")
+async def list_listings(request: Request):
+    await simulate_latency()
+    player_id = int_param(request, "playerId")
+    if player_id is not None:
+        return [l for l in LISTINGS if l["player"]["id"] == player_id][:1]
+
+    listings = LISTINGS
+    positions = request.query_params.get("positions")
+    if positions:
+        wanted = {p.strip().upper() for p in positions.split(",") if p.strip()}
+        listings = [l for l in listings if wanted & set(l["player"]["metadata"]["positions"])]
+    for attr in ATTRIBUTES:
+        minimum = int_param(request, f"{attr}Min")
+        if minimum is not None:
+            listings = [l for l in listings if l["player"]["metadata"][attr] >= minimum]
+    if request.query_params.get("sorts") == "listing.price":
+        listings = sorted(listings, key=lambda l: l["price"], reverse=request.query_params.get("sortsOrders") == "DESC")
+    offset = int_param(request, "offset", 0)
+    limit = int_param(request, "limit", 50)
+    return listings[offset:offset + limit]
+
+@app.get("/events")
+async def list_events(request: Request):
+    await simulate_latency()
+    limit = int_param(request, "limit", 100)
+    after = int_param(request, "afterEventId")
+    if after is None:
+        return EVENTS[-1:]
+    return [e for e in EVENTS if e["id"] > after][:limit]
@@ -1,22 +1,109 @@
 # file: main.py
 
-from fastapi import FastAPI, HTTPException, Body
+from fastapi import FastAPI, HTTPException, Body, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-import requests
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import aclosing, asynccontextmanager, contextmanager
+from contextvars import ContextVar, copy_context
+from datetime import datetime, timedelta, timezone
+import asyncio
+import gzip
+import hashlib
+import httpx
 import json
+import multiprocessing
+import orjson
+import os
+import random
+import secrets
+import sqlite3
+import sys
+import threading
+import time
+import numpy as np
 import pandas as pd
+from scoring import (ScoringEngine, fit_label, greedy_assignment, optimal_assignment, assignment_total, squad_slot,
+                     recommend_formation, role_analysis_chunk, formation_chunk)
 from typing import Dict, List, Any, Optional
+try:
+    import msgpack
+except ImportError:  # optional: enables the MessagePack roster format
+    msgpack = None
+try:
+    import brotli
+except ImportError:  # optional: enables br response compression
+    brotli = None
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:  # optional: enables roster/listing snapshots
+    pa = None
 
 # --- Config ---
 ROLES_PATH = "roles.json"
 FORMATIONS_PATH = "formations.json"
-SQUADS_PATH = "squads.json"
+SQUADS_PATH = "squads.json"      # legacy store, migrated once into SQUADS_DB_PATH
+SQUADS_DB_PATH = os.getenv("SQUADS_DB_PATH", "squads.db")
 OWNER_WALLET = "0x5d4143c95673cba6"
-PLAYERS_API_BASE = "https://z519wdyajg.execute-api.us-east-1.amazonaws.com/prod/players"
-PLAYERS_API_OWNED = (f"{PLAYERS_API_BASE}?limit=1500&ownerWalletAddress={OWNER_WALLET}")
-MARKETPLACE_API = "https://z519wdyajg.execute-api.us-east-1.amazonaws.com/prod/listings"
-EVENTS_API_BASE = "https://z519wdyajg.execute-api.us-east-1.amazonaws.com/prod/events"
+MFL_API_BASE = os.getenv("MFL_API_BASE", "https://z519wdyajg.execute-api.us-east-1.amazonaws.com/prod")  # point at a stub for benchmarks
+OWNED_PLAYERS_LIMIT = int(os.getenv("OWNED_PLAYERS_LIMIT", "1500"))
+PLAYERS_API_BASE = f"{MFL_API_BASE}/players"
+PLAYERS_API_OWNED = (f"{PLAYERS_API_BASE}?limit={OWNED_PLAYERS_LIMIT}&ownerWalletAddress={OWNER_WALLET}")
+MARKETPLACE_API = f"{MFL_API_BASE}/listings"
+EVENTS_API_BASE = os.getenv("EVENTS_API_BASE", f"{MFL_API_BASE}/events")
+EVENTS_POLL_INTERVAL = float(os.getenv("EVENTS_POLL_INTERVAL", "30"))       # seconds between polls; 0 disables the poller
+EVENTS_PAGE_SIZE = int(os.getenv("EVENTS_PAGE_SIZE", "100"))
+EVENTS_MAX_PAGES = int(os.getenv("EVENTS_MAX_PAGES", "10"))                 # pages drained per poll
+EVENTS_CURSOR_PARAM = os.getenv("EVENTS_CURSOR_PARAM", "afterEventId")     # events API incremental-read parameter
+UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", "30"))                  # read timeout for roster/player/market calls
+UPSTREAM_LISTING_TIMEOUT = float(os.getenv("UPSTREAM_LISTING_TIMEOUT", "10"))  # single-listing lookups
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "5"))
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "50"))
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "20"))
+UPSTREAM_PER_HOST_LIMIT = int(os.getenv("UPSTREAM_PER_HOST_LIMIT", "10"))     # concurrent in-flight requests per host
+UPSTREAM_RATE_LIMIT = float(os.getenv("UPSTREAM_RATE_LIMIT", "100"))           # requests/second per target API; 0 disables
+UPSTREAM_RATE_BURST = int(os.getenv("UPSTREAM_RATE_BURST", "200"))
+UPSTREAM_RETRIES = int(os.getenv("UPSTREAM_RETRIES", "2"))                     # extra attempts for retryable failures
+UPSTREAM_RETRY_BACKOFF = float(os.getenv("UPSTREAM_RETRY_BACKOFF", "0.2"))     # base delay, doubled per attempt, full jitter
+UPSTREAM_RETRY_MAX_DELAY = float(os.getenv("UPSTREAM_RETRY_MAX_DELAY", "5"))
+UPSTREAM_BREAKER_FAILURES = int(os.getenv("UPSTREAM_BREAKER_FAILURES", "5"))   # consecutive failures that open a target's breaker
+UPSTREAM_BREAKER_COOLDOWN = float(os.getenv("UPSTREAM_BREAKER_COOLDOWN", "30"))  # seconds open before one trial request
+UPSTREAM_STALE_MAX_ENTRIES = int(os.getenv("UPSTREAM_STALE_MAX_ENTRIES", "2048"))  # last-known-good responses kept
+MARKET_PAGE_SIZE = int(os.getenv("MARKET_PAGE_SIZE", "50"))
+MARKET_PAGE_OFFSET_PARAM = os.getenv("MARKET_PAGE_OFFSET_PARAM", "offset")  # listings API paging parameter
+MARKET_DEEP_MAX_PAGES = int(os.getenv("MARKET_DEEP_MAX_PAGES", "20"))        # hard cap for deep searches
+MARKET_DEEP_CONCURRENCY = int(os.getenv("MARKET_DEEP_CONCURRENCY", "4"))    # pages prefetched in parallel
+MARKET_SCAN_MAX_TARGETS = int(os.getenv("MARKET_SCAN_MAX_TARGETS", "32"))
+MARKET_SCAN_MAX_PAGES = int(os.getenv("MARKET_SCAN_MAX_PAGES", "20"))
+PLAYER_CACHE_TTL = float(os.getenv("PLAYER_CACHE_TTL", "900"))              # player metadata rarely changes
+PLAYER_CACHE_MAX_STALE = float(os.getenv("PLAYER_CACHE_MAX_STALE", "86400"))
+PLAYER_CACHE_MAX_BYTES = int(os.getenv("PLAYER_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+LISTING_CACHE_TTL = float(os.getenv("LISTING_CACHE_TTL", "30"))              # prices and status move quickly
+LISTING_CACHE_MAX_STALE = float(os.getenv("LISTING_CACHE_MAX_STALE", "300"))
+LISTING_CACHE_MAX_BYTES = int(os.getenv("LISTING_CACHE_MAX_BYTES", str(4 * 1024 * 1024)))
+RESPONSE_COMPRESS_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "1024"))
+ROLE_ANALYSIS_BATCH_MAX = int(os.getenv("ROLE_ANALYSIS_BATCH_MAX", "500"))  # player ids per batch request
+CLUB_BULK_MAX_OPERATIONS = int(os.getenv("CLUB_BULK_MAX_OPERATIONS", "10000"))
+OWNED_CACHE_TTL = float(os.getenv("OWNED_CACHE_TTL", "300"))              # seconds a roster is served as fresh
+OWNED_CACHE_MAX_STALE = float(os.getenv("OWNED_CACHE_MAX_STALE", "3600"))  # beyond this a stale roster is reloaded inline
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+SNAPSHOT_SERVE = os.getenv("SNAPSHOT_SERVE", "0") == "1"            # serve reads from the latest snapshots instead of upstream
+SNAPSHOT_INTERVAL = float(os.getenv("SNAPSHOT_INTERVAL", "0"))       # seconds between automatic snapshots; 0 disables
+SNAPSHOT_KEEP = int(os.getenv("SNAPSHOT_KEEP", "48"))                # snapshots kept per kind
+SNAPSHOT_MARKET_MAX_PAGES = int(os.getenv("SNAPSHOT_MARKET_MAX_PAGES", "40"))
+SNAPSHOT_AUTH_TOKEN = os.getenv("SNAPSHOT_AUTH_TOKEN", "")            # listings API token for scheduled snapshots
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0") == "1"          # Server-Timing on every response; clients can also send X-Server-Timing: 1
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "0") == "1"    # allows the /debug/profiler endpoints
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", "300"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))                  # background jobs running at once
+JOB_PROCESSES = int(os.getenv("JOB_PROCESSES", str(min(4, os.cpu_count() or 1))))  # CPU-bound job chunks; 0 runs them on threads
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "100"))            # queued jobs before submissions are refused
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "900"))        # seconds a finished job and its result are kept
+JOB_CHUNK_SIZE = int(os.getenv("JOB_CHUNK_SIZE", "250"))          # players per role-analysis chunk
 TIER_THRESH = {'Diamond':[97,93,90,87], 'Platinum':[93,90,87,84], 'Gold':[90,87,84,80], 'Silver':[87,84,80,77], 'Bronze':[84,80,77,74], 'Iron':[80,77,74,70], 'Stone':[77,74,70,66], 'Ice':[74,70,66,61], 'Spark':[70,66,61,57], 'Flint':[66,61,57,52]}
 ATTRIBUTE_WEIGHTS = [4, 3, 2, 1]
 ATTR_MAP = {"PAC": "pace", "SHO": "shooting", "PAS": "passing", "DRI": "dribbling", "DEF": "defense", "PHY": "physical", "GK": "goalkeeping"}
@@ -28,26 +115,851 @@ def load_roles():
     with open(ROLES_PATH, "r", encoding="utf-8") as f: return json.load(f)
 def load_formations():
     with open(FORMATIONS_PATH, "r", encoding="utf-8") as f: return json.load(f)
-def load_squads():
+def load_squads(path=SQUADS_PATH):
     try:
-        with open(SQUADS_PATH, "r", encoding="utf-8") as f: return json.load(f)
+        with open(path, "r", encoding="utf-8") as f: return json.load(f)
     except (FileNotFoundError, json.JSONDecodeError): return {}
 
-def save_squads(squads_data):
-    with open(SQUADS_PATH, "w", encoding="utf-8") as f:
-        json.dump(squads_data, f, indent=4)
+# --- Metrics ---
+# A small in-process registry rendered in the Prometheus text format on /metrics. Hot paths wrap
+# their work in timed(phase) (upstream, scoring, persistence, serialization): inside a request the
+# time is added to that request's phase totals, which MetricsMiddleware observes per route when the
+# request ends (and can echo as a Server-Timing header); outside a request it is observed at once
+# under route "background". Phase totals are cumulative, so concurrent upstream calls can add up to
+# more than the request's wall time.
+METRICS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra: pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels=(), lock=None):
+        self.name, self.help_text, self.labels = name, help_text, tuple(labels)
+        self._lock = lock or threading.Lock()
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            lines += [f"{self.name}{format_labels(self.labels, key)} {value}" for key, value in self._values.items()]
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels=(), buckets=METRICS_BUCKETS, lock=None):
+        self.name, self.help_text, self.labels, self.buckets = name, help_text, tuple(labels), tuple(buckets)
+        self._lock = lock or threading.Lock()
+        self._values: Dict[tuple, list] = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            series = self._values.get(label_values)
+            if series is None:
+                series = self._values[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound: series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in self._values.items():
+                for bound, count in zip(self.buckets, series):
+                    le = f'le="{bound:g}"'
+                    lines.append(f"{self.name}_bucket{format_labels(self.labels, key, le)} {count}")
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{format_labels(self.labels, key, le)} {series[-1]}")
+                lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {series[-2]}")
+                lines.append(f"{self.name}_count{format_labels(self.labels, key)} {series[-1]}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = []
+
+    def counter(self, name: str, help_text: str, labels=()) -> Counter:
+        metric = Counter(name, help_text, labels, self._lock)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labels=(), buckets=METRICS_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labels, buckets, self._lock)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self._metrics for line in metric.render()) + "\n"
+
+METRICS = MetricsRegistry()
+HTTP_REQUESTS = METRICS.counter("mfl_http_requests_total", "HTTP requests served", ["method", "route", "status"])
+HTTP_SECONDS = METRICS.histogram("mfl_http_request_duration_seconds", "Time to serve an HTTP request", ["method", "route"])
+PHASE_SECONDS = METRICS.histogram("mfl_phase_duration_seconds", "Time spent per request phase (cumulative within a request)", ["route", "phase"])
+UPSTREAM_SECONDS = METRICS.histogram("mfl_upstream_request_duration_seconds", "Upstream API latency, including the per-host queue", ["target", "status"])
+UPSTREAM_RESPONSES = METRICS.counter("mfl_upstream_responses_total", "Upstream API responses by status ('error' for transport failures)", ["target", "status"])
+UPSTREAM_EVENTS = METRICS.counter("mfl_upstream_gateway_events_total", "Upstream gateway events (coalesced, throttled, retried, rejected, stale_served, breaker_opened)", ["target", "event"])
+SCORED_EVALUATIONS = METRICS.counter("mfl_scored_evaluations_total", "Player-role(-tier) fit evaluations computed by the scoring engine", ["method"])
+JOBS_FINISHED = METRICS.counter("mfl_jobs_total", "Background jobs by kind and final status", ["kind", "status"])
+
+REQUEST_TIMINGS: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+def record_phase(phase: str, seconds: float):
+    timings = REQUEST_TIMINGS.get()
+    if timings is None:
+        PHASE_SECONDS.observe(seconds, "background", phase)
+    else:
+        timings[phase] = timings.get(phase, 0.0) + seconds
+
+# Usable as `with timed("scoring"):` or as a decorator.
+@contextmanager
+def timed(phase: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(phase, time.perf_counter() - started)
+
+# create_task for work that outlives (or is shared between) requests: it starts without the caller's
+# phase totals, so its phases are observed under "background" instead of leaking into one request.
+def background_task(coro) -> asyncio.Task:
+    context = copy_context()
+    context.run(REQUEST_TIMINGS.set, None)
+    return asyncio.create_task(coro, context=context)
+
+# Pure ASGI so the timings context lives in the request's own task and the Server-Timing header can
+# be added to streaming responses too (their body phases are observed but not in the header).
+class MetricsMiddleware:
+    def __init__(self, app, server_timing: bool = False):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        timings: Dict[str, float] = {}
+        token = REQUEST_TIMINGS.set(timings)
+        started = time.perf_counter()
+        status = 500
+        want_header = self.server_timing or any(k == b"x-server-timing" and v not in (b"", b"0") for k, v in scope.get("headers", []))
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if want_header:
+                    entries = [f"{phase};dur={seconds * 1000:.2f}" for phase, seconds in timings.items()]
+                    entries.append(f"app;dur={(time.perf_counter() - started) * 1000:.2f}")
+                    message = {**message, "headers": list(message.get("headers", [])) + [(b"server-timing", ", ".join(entries).encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            REQUEST_TIMINGS.reset(token)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_SECONDS.observe(time.perf_counter() - started, scope["method"], route)
+            HTTP_REQUESTS.inc(scope["method"], route, str(status))
+            for phase, seconds in timings.items():
+                PHASE_SECONDS.observe(seconds, route, phase)
+
+class TimedJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        with timed("serialization"):
+            return super().render(content)
+
+# --- Sampling Profiler ---
+# Off unless PROFILER_ENABLED. While running, a daemon thread snapshots every other thread's stack
+# each interval and counts identical stacks; the result is served in collapsed-stack format
+# ("outer;inner count" per line), ready for flamegraph.pl or speedscope.
+class SamplingProfiler:
+    MAX_DEPTH = 64
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._stacks: Dict[str, int] = {}
+        self.samples = 0
+        self.interval = 0.0
+        self.started_at: Optional[float] = None
+        self.stopped_at: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval: float, duration: float) -> bool:
+        if self.running:
+            return False
+        with self._lock:
+            self._stacks, self.samples = {}, 0
+        self.interval, self.started_at, self.stopped_at = interval, time.time(), None
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(time.monotonic() + duration,), name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _run(self, deadline: float):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, frame in frames.items():
+                    if thread_id == own: continue
+                    stack = []
+                    while frame is not None and len(stack) < self.MAX_DEPTH:
+                        code = frame.f_code
+                        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                        frame = frame.f_back
+                    key = ";".join(reversed(stack))
+                    self._stacks[key] = self._stacks.get(key, 0) + 1
+                self.samples += 1
+        self.stopped_at = time.time()
+
+    def collapsed(self) -> str:
+        with self._lock:
+            return "".join(f"{stack} {count}\n" for stack, count in sorted(self._stacks.items(), key=lambda item: -item[1]))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": PROFILER_ENABLED,
+            "running": self.running,
+            "interval_seconds": self.interval,
+            "samples": self.samples,
+            "distinct_stacks": len(self._stacks),
+            "started_at": self.started_at,
+            "stopped_at": self.stopped_at,
+        }
+
+PROFILER = SamplingProfiler()
+
+# --- Squad Store ---
+# Clubs live in SQLite (WAL) with one row per club and one row per roster entry, so a mutation
+# only touches the rows it changes and runs in a single transaction. Reads are served from an
+# in-process copy that each committed write refreshes for the clubs it touched, together with a
+# player -> club reverse index. A unique index on club_players.player_id keeps every player in at
+# most one club.
+class RosterConflict(Exception):
+    def __init__(self, conflicts: Dict[int, str]):
+        super().__init__(f"Players already assigned to another club: {conflicts}")
+        self.conflicts = conflicts
+
+class SquadStore:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS clubs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            tier TEXT NOT NULL DEFAULT 'Iron'
+        );
+        CREATE TABLE IF NOT EXISTS club_players (
+            club_id INTEGER NOT NULL REFERENCES clubs(id) ON DELETE CASCADE,
+            player_id INTEGER NOT NULL,
+            slot INTEGER NOT NULL,
+            PRIMARY KEY (club_id, player_id)
+        );
+        CREATE TABLE IF NOT EXISTS store_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS club_summaries (
+            club_id INTEGER PRIMARY KEY REFERENCES clubs(id) ON DELETE CASCADE,
+            fingerprint TEXT NOT NULL,
+            summary TEXT NOT NULL
+        );
+    """
+    # Databases created before the one-club rule may hold a player twice; the oldest club keeps them.
+    PLAYER_INDEX = """
+        DELETE FROM club_players WHERE EXISTS (
+            SELECT 1 FROM club_players o
+            WHERE o.player_id = club_players.player_id AND o.club_id < club_players.club_id
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS club_players_player ON club_players (player_id);
+    """
+
+    def __init__(self, db_path: str, legacy_path: Optional[str] = None):
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(self.SCHEMA)
+        self._lock = threading.RLock()
+        self.version = 0  # bumped on every committed club change; part of roster ETags
+        self.listeners = []  # fn(touched club names) after every committed club change
+        with self.transaction() as conn:
+            if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'club_players_player'").fetchone():
+                for statement in self.PLAYER_INDEX.split(";"):
+                    if statement.strip(): conn.execute(statement)
+        if legacy_path:
+            self._migrate_legacy(legacy_path)
+        self._clubs: Dict[str, Dict[str, Any]] = {}
+        self._player_club: Dict[int, str] = {}
+        self._refresh()
+
+    # Legacy squads.json holds either {"name": {"club_name", "tier", "roster"}} or {"name": [ids]}.
+    def _migrate_legacy(self, legacy_path: str):
+        with self.transaction() as conn:
+            if conn.execute("SELECT 1 FROM store_meta WHERE key = 'legacy_migrated'").fetchone():
+                return
+            legacy = load_squads(legacy_path)
+            for club_name, club_data in (legacy if isinstance(legacy, dict) else {}).items():
+                if isinstance(club_data, dict):
+                    tier, roster = club_data.get("tier") or "Iron", club_data.get("roster") or []
+                elif isinstance(club_data, list):
+                    tier, roster = "Iron", club_data
+                else:
+                    continue
+                if conn.execute("SELECT 1 FROM clubs WHERE name = ?", (club_name,)).fetchone():
+                    continue
+                club_id = conn.execute("INSERT INTO clubs (name, tier) VALUES (?, ?)", (club_name, tier)).lastrowid
+                # A player listed in several legacy clubs stays in the first one
+                self._write_roster(conn, club_id, roster, skip_assigned=True)
+            conn.execute("INSERT INTO store_meta (key, value) VALUES ('legacy_migrated', ?)", (f"{legacy_path}@{int(time.time())}",))
+
+    # Clubs named in `touched` (filled in by the caller) are refreshed before the lock is released,
+    # so the in-process copy never lags a commit.
+    @contextmanager
+    def transaction(self, touched: Optional[List[str]] = None):
+        with self._lock, timed("persistence"):
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            if touched:
+                self._refresh(touched)
+                self.version += 1
+                for listener in self.listeners:
+                    listener(list(touched))
+
+    @staticmethod
+    def _write_roster(conn, club_id: int, roster: List[int], skip_assigned: bool = False):
+        conn.execute("DELETE FROM club_players WHERE club_id = ?", (club_id,))
+        unique_roster = list(dict.fromkeys(int(pid) for pid in roster))
+        verb = "INSERT OR IGNORE" if skip_assigned else "INSERT"
+        conn.executemany(f"{verb} INTO club_players (club_id, player_id, slot) VALUES (?, ?, ?)", [(club_id, pid, i) for i, pid in enumerate(unique_roster)])
+
+    # Players of `roster` that already belong to a club other than `club_name`.
+    def _conflicts(self, club_name: str, roster: List[int]) -> Dict[int, str]:
+        conflicts = {}
+        for pid in roster:
+            owner = self._player_club.get(int(pid))
+            if owner is not None and owner != club_name:
+                conflicts[int(pid)] = owner
+        return conflicts
+
+    def _club_id(self, conn, club_name: str) -> Optional[int]:
+        row = conn.execute("SELECT id FROM clubs WHERE name = ?", (club_name,)).fetchone()
+        return row[0] if row else None
+
+    # Reload the in-process copy, either completely or only for the named clubs.
+    def _refresh(self, names: Optional[List[str]] = None):
+        with self._lock:
+            if names is None:
+                clubs: Dict[str, Dict[str, Any]] = {}
+                rows = self._conn.execute(
+                    "SELECT c.name, c.tier, p.player_id FROM clubs c "
+                    "LEFT JOIN club_players p ON p.club_id = c.id ORDER BY c.id, p.slot").fetchall()
+                for name, tier, player_id in rows:
+                    club = clubs.setdefault(name, {"club_name": name, "tier": tier, "roster": []})
+                    if player_id is not None: club["roster"].append(player_id)
+                self._clubs = clubs
+                self._player_club = {pid: name for name, club in clubs.items() for pid in club["roster"]}
+                return
+            clubs, player_club = dict(self._clubs), dict(self._player_club)
+            for name in names:
+                for pid in (clubs.pop(name, None) or {}).get("roster", []):
+                    if player_club.get(pid) == name: del player_club[pid]
+            for name in names:
+                row = self._conn.execute("SELECT id, tier FROM clubs WHERE name = ?", (name,)).fetchone()
+                if row is None:
+                    continue
+                roster = [r[0] for r in self._conn.execute("SELECT player_id FROM club_players WHERE club_id = ? ORDER BY slot", (row[0],))]
+                clubs[name] = {"club_name": name, "tier": row[1], "roster": roster}
+                player_club.update((pid, name) for pid in roster)
+            self._clubs, self._player_club = clubs, player_club
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM store_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        with self.transaction() as conn:
+            conn.execute("INSERT INTO store_meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value", (key, value))
+
+    # Materialised club summaries: name -> (fingerprint, summary). Saving them is not a club change.
+    def load_summaries(self) -> Dict[str, tuple]:
+        rows = self._conn.execute("SELECT c.name, s.fingerprint, s.summary FROM club_summaries s JOIN clubs c ON c.id = s.club_id").fetchall()
+        return {name: (fingerprint, orjson.loads(summary)) for name, fingerprint, summary in rows}
+
+    def save_summaries(self, summaries: Dict[str, tuple]):
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO club_summaries (club_id, fingerprint, summary) SELECT id, ?, ? FROM clubs WHERE name = ? "
+                "ON CONFLICT(club_id) DO UPDATE SET fingerprint = excluded.fingerprint, summary = excluded.summary",
+                [(fingerprint, orjson.dumps(summary).decode(), name) for name, (fingerprint, summary) in summaries.items()])
+
+    def list_clubs(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [{**club, "roster": list(club["roster"])} for club in self._clubs.values()]
+
+    def get_club(self, club_name: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            club = self._clubs.get(club_name)
+            return {**club, "roster": list(club["roster"])} if club else None
+
+    def player_club_map(self) -> Dict[int, str]:
+        with self._lock:
+            return dict(self._player_club)
+
+    def club_of(self, player_id: int) -> Optional[str]:
+        return self._player_club.get(player_id)
+
+    # Writes add a club to `touched` only once they change it, so a rejected write (unknown or
+    # duplicate club) commits nothing and leaves version, ETags and listeners alone.
+    def create_club(self, club_name: str, tier: str, roster: List[int]) -> bool:
+        touched: List[str] = []
+        with self.transaction(touched=touched) as conn:
+            if self._club_id(conn, club_name) is not None:
+                return False
+            conflicts = self._conflicts(club_name, roster)
+            if conflicts:
+                raise RosterConflict(conflicts)
+            club_id = conn.execute("INSERT INTO clubs (name, tier) VALUES (?, ?)", (club_name, tier)).lastrowid
+            self._write_roster(conn, club_id, roster)
+            touched.append(club_name)
+        return True
+
+    def set_roster(self, club_name: str, roster: List[int]) -> bool:
+        touched: List[str] = []
+        with self.transaction(touched=touched) as conn:
+            club_id = self._club_id(conn, club_name)
+            if club_id is None:
+                return False
+            conflicts = self._conflicts(club_name, roster)
+            if conflicts:
+                raise RosterConflict(conflicts)
+            self._write_roster(conn, club_id, roster)
+            touched.append(club_name)
+        return True
+
+    def delete_club(self, club_name: str) -> bool:
+        touched: List[str] = []
+        with self.transaction(touched=touched) as conn:
+            if not conn.execute("DELETE FROM clubs WHERE name = ?", (club_name,)).rowcount:
+                return False
+            touched.append(club_name)
+        return True
+
+    # Move the player out of whichever club holds them (found via the index) and append them to
+    # new_club, atomically. "Unassigned" or an unknown new_club leaves the player unassigned.
+    def move_player(self, player_id: int, new_club: str):
+        touched: List[str] = []
+        with self.transaction(touched=touched) as conn:
+            current = self._player_club.get(player_id)
+            if current == new_club:
+                return
+            if current is not None:
+                conn.execute("DELETE FROM club_players WHERE player_id = ?", (player_id,))
+                touched.append(current)
+            new_id = self._club_id(conn, new_club) if new_club != "Unassigned" else None
+            if new_id is not None:
+                conn.execute(
+                    "INSERT INTO club_players (club_id, player_id, slot) "
+                    "SELECT ?, ?, COALESCE(MAX(slot), -1) + 1 FROM club_players WHERE club_id = ?",
+                    (new_id, player_id, new_id))
+                touched.append(new_club)
+
+    # Validate `operations` in order against the current clubs as changed by the operations before
+    # them, then write every touched club in one transaction. Operations are dicts with "op":
+    #   assign       player_id, club_name ("Unassigned" removes the player from their club)
+    #   remove       player_id
+    #   set_roster   club_name, roster
+    #   create_club  club_name, tier, roster
+    #   delete_club  club_name
+    # Returns (applied, per-operation results). With atomic=True one invalid operation means nothing
+    # is written; otherwise invalid operations are skipped and the rest are applied.
+    def apply_operations(self, operations: List[Dict[str, Any]], atomic: bool = True):
+        touched: List[str] = []
+        with self.transaction(touched=touched) as conn:
+            clubs = {name: {"tier": club["tier"], "roster": dict.fromkeys(club["roster"])} for name, club in self._clubs.items()}
+            player_club = dict(self._player_club)
+            created, deleted, changed = set(), set(), set()
+            results = []
+
+            def take(player_id: int, club_name: Optional[str]):
+                current = player_club.pop(player_id, None)
+                if current is not None:
+                    clubs[current]["roster"].pop(player_id, None)
+                    changed.add(current)
+                if club_name is not None:
+                    clubs[club_name]["roster"][player_id] = None
+                    player_club[player_id] = club_name
+                    changed.add(club_name)
+
+            def conflicts(club_name: str, roster: List[int]) -> Dict[int, str]:
+                return {pid: player_club[pid] for pid in roster if player_club.get(pid) not in (None, club_name)}
+
+            for index, op in enumerate(operations):
+                kind, club_name, player_id = op.get("op"), op.get("club_name"), op.get("player_id")
+                roster = list(dict.fromkeys(int(pid) for pid in (op.get("roster") or [])))
+                error = None
+                if kind in ("assign", "remove") and player_id is None:
+                    error = "player_id is required"
+                elif kind in ("assign", "set_roster", "create_club", "delete_club") and not club_name:
+                    error = "club_name is required"
+                elif kind == "assign":
+                    if club_name != "Unassigned" and club_name not in clubs:
+                        error = f"Club '{club_name}' not found"
+                    elif player_club.get(player_id) != club_name:
+                        take(player_id, None if club_name == "Unassigned" else club_name)
+                elif kind == "remove":
+                    take(player_id, None)
+                elif kind == "set_roster":
+                    if club_name not in clubs:
+                        error = f"Club '{club_name}' not found"
+                    elif conflicts(club_name, roster):
+                        error = {"message": "Players already belong to another club", "conflicts": conflicts(club_name, roster)}
+                    else:
+                        for pid in clubs[club_name]["roster"]:
+                            del player_club[pid]
+                        clubs[club_name]["roster"] = dict.fromkeys(roster)
+                        player_club.update((pid, club_name) for pid in roster)
+                        changed.add(club_name)
+                elif kind == "create_club":
+                    if club_name in clubs:
+                        error = f"Club '{club_name}' already exists"
+                    elif conflicts(club_name, roster):
+                        error = {"message": "Players already belong to another club", "conflicts": conflicts(club_name, roster)}
+                    else:
+                        clubs[club_name] = {"tier": op.get("tier") or "Iron", "roster": dict.fromkeys(roster)}
+                        player_club.update((pid, club_name) for pid in roster)
+                        created.add(club_name)
+                        deleted.discard(club_name)
+                        changed.add(club_name)
+                elif kind == "delete_club":
+                    if club_name not in clubs:
+                        error = f"Club '{club_name}' not found"
+                    else:
+                        for pid in clubs.pop(club_name)["roster"]:
+                            del player_club[pid]
+                        deleted.add(club_name)
+                        created.discard(club_name)
+                        changed.discard(club_name)
+                else:
+                    error = f"Unknown op '{kind}'"
+                results.append({"index": index, "op": kind, "ok": error is None, **({"error": error} if error else {})})
+
+            if atomic and not all(r["ok"] for r in results):
+                return False, results
+            # Clear every touched roster before inserting, so moves between clubs never trip the
+            # one-club index
+            club_ids = {name: self._club_id(conn, name) for name in changed | deleted}
+            conn.executemany("DELETE FROM club_players WHERE club_id = ?", [(cid,) for cid in club_ids.values() if cid is not None])
+            conn.executemany("DELETE FROM clubs WHERE name = ?", [(name,) for name in deleted])
+            for name in created:
+                if club_ids.get(name) is not None:  # deleted and re-created within the batch
+                    conn.execute("DELETE FROM clubs WHERE id = ?", (club_ids[name],))
+                club_ids[name] = conn.execute("INSERT INTO clubs (name, tier) VALUES (?, ?)", (name, clubs[name]["tier"])).lastrowid
+            conn.executemany(
+                "INSERT INTO club_players (club_id, player_id, slot) VALUES (?, ?, ?)",
+                [(club_ids[name], pid, slot) for name in changed for slot, pid in enumerate(clubs[name]["roster"])])
+            touched.extend(changed | deleted)
+        return True, results
+
 ROLES_DATA = load_roles()
 FORMATION_MAPS = load_formations()
-SAVED_SQUADS = load_squads()
+SQUAD_STORE = SquadStore(SQUADS_DB_PATH, legacy_path=SQUADS_PATH)
 ROLE_LOOKUP = {(r.get("Role") or r.get("RoleType") or "").strip().upper(): r for r in ROLES_DATA}
-app = FastAPI()
+
+# --- Upstream Client ---
+# The gateway between every endpoint and the external APIs, one pooled keep-alive AsyncClient
+# behind it. For each GET, in order:
+#   singleflight  identical in-flight requests (url, params, headers) share one upstream call
+#   breaker       per target API; after `breaker_failures` consecutive failures (transport errors,
+#                 5xx) the target fails fast for `breaker_cooldown` seconds, then one trial request
+#                 decides whether it closes again
+#   rate limit    a token bucket per target API; callers wait for a token
+#   host slots    a semaphore per host caps concurrent in-flight requests
+#   retries       connect errors, 429/502/503/504 are retried with full-jitter exponential backoff
+#                 (Retry-After honoured up to the max delay); read timeouts are not retried
+# Callers that pass stale_ok=True get the last good response for the same request when the target
+# is failing (transport error, 5xx, or 429 after the retries) or its breaker is open (marked with
+# extensions["stale"]); everyone else gets UpstreamUnavailable, answered with 503 by the app.
+UPSTREAM_TARGETS = {"players": PLAYERS_API_BASE, "listings": MARKETPLACE_API, "events": EVENTS_API_BASE}
+RETRYABLE_STATUS = {429, 502, 503, 504}
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout, httpx.RemoteProtocolError)
+
+def upstream_target(url: str) -> str:
+    return next((name for name, base in UPSTREAM_TARGETS.items() if url.startswith(base)), "other")
+
+class UpstreamUnavailable(httpx.HTTPError):
+    def __init__(self, target: str, retry_after: float):
+        super().__init__(f"Upstream '{target}' is unavailable (circuit open)")
+        self.target = target
+        self.retry_after = retry_after
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    # Seconds spent waiting for the token.
+    async def acquire(self) -> float:
+        waited = 0.0
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return waited
+            delay = (1 - self.tokens) / self.rate
+            await asyncio.sleep(delay)
+            waited += delay
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, cooldown: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = "closed"  # closed -> open -> half_open -> closed | open
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_inflight = False
+
+    def retry_after(self) -> float:
+        return max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+
+    # Whether a request may go out now; in half_open only a single trial is let through.
+    def allow(self) -> bool:
+        if self.state == "open" and not self.retry_after():
+            self.state = "half_open"
+        if self.state == "closed":
+            return True
+        if self.state == "half_open" and not self.trial_inflight:
+            self.trial_inflight = True
+            return True
+        return False
+
+    def record(self, ok: bool) -> bool:
+        self.trial_inflight = False
+        if ok:
+            self.state, self.failures = "closed", 0
+            return False
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            opened = self.state != "open"
+            self.state, self.opened_at = "open", time.monotonic()
+            return opened
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self.failures, "retry_after_seconds": round(self.retry_after(), 3) if self.state == "open" else None}
+
+class UpstreamClient:
+    def __init__(self, timeout: float, connect_timeout: float, max_connections: int, max_keepalive: int, per_host_limit: int,
+                 rate_limit: float = 0, rate_burst: int = 1, retries: int = 0, retry_backoff: float = 0.2, retry_max_delay: float = 5,
+                 breaker_failures: int = 5, breaker_cooldown: float = 30, stale_max_entries: int = 0):
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive)
+        self.per_host_limit = per_host_limit
+        self.rate_limit, self.rate_burst = rate_limit, rate_burst
+        self.retries, self.retry_backoff, self.retry_max_delay = retries, retry_backoff, retry_max_delay
+        self.breaker_failures, self.breaker_cooldown = breaker_failures, breaker_cooldown
+        self.stale_max_entries = stale_max_entries
+        self._client: Optional[httpx.AsyncClient] = None
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._inflight: Dict[tuple, asyncio.Task] = {}
+        self._last_good: "OrderedDict[tuple, httpx.Response]" = OrderedDict()
+        self.counts: Dict[str, Dict[str, int]] = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits)
+        return self._client
+
+    def breaker(self, target: str) -> CircuitBreaker:
+        breaker = self._breakers.get(target)
+        if breaker is None:
+            breaker = self._breakers[target] = CircuitBreaker(self.breaker_failures, self.breaker_cooldown)
+        return breaker
+
+    def _count(self, target: str, event: str):
+        target_counts = self.counts.setdefault(target, {})
+        target_counts[event] = target_counts.get(event, 0) + 1
+        UPSTREAM_EVENTS.inc(target, event)
+
+    async def get(self, url: str, params: Optional[Dict] = None, headers: Optional[Dict] = None, timeout: Optional[float] = None, stale_ok: bool = False) -> httpx.Response:
+        key = (url, tuple(sorted((params or {}).items())), tuple(sorted((headers or {}).items())), timeout, stale_ok)
+        started = time.perf_counter()
+        try:
+            task = self._inflight.get(key)
+            if task is not None:
+                self._count(upstream_target(url), "coalesced")
+            else:
+                task = background_task(self._flight(key, url, params, headers, timeout, stale_ok))
+                self._inflight[key] = task
+                task.add_done_callback(lambda t: self._flight_done(key, t))
+            return await asyncio.shield(task)
+        finally:
+            record_phase("upstream", time.perf_counter() - started)
+
+    def _flight_done(self, key: tuple, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # retrieved here so a flight nobody awaits any more does not log
+
+    async def _flight(self, key: tuple, url: str, params, headers, timeout, stale_ok: bool) -> httpx.Response:
+        target = upstream_target(url)
+        breaker = self.breaker(target)
+        if not breaker.allow():
+            self._count(target, "rejected")
+            stale = self._stale(key, target) if stale_ok else None
+            if stale is not None:
+                return stale
+            raise UpstreamUnavailable(target, breaker.retry_after())
+        try:
+            response = await self._send(target, url, params, headers, timeout)
+        except httpx.HTTPError:
+            if breaker.record(False): self._count(target, "breaker_opened")
+            stale = self._stale(key, target) if stale_ok else None
+            if stale is not None:
+                return stale
+            raise
+        except BaseException:
+            breaker.trial_inflight = False  # cancelled or not an upstream failure; let the next request try
+            raise
+        ok = response.status_code < 500
+        if breaker.record(ok): self._count(target, "breaker_opened")
+        if stale_ok:
+            if response.is_success:
+                self._last_good[key] = response
+                self._last_good.move_to_end(key)
+                while len(self._last_good) > self.stale_max_entries:
+                    self._last_good.popitem(last=False)
+            elif not ok or response.status_code == 429:  # still throttled after the retries: as unhealthy as a 5xx
+                return self._stale(key, target) or response
+        return response
+
+    def _stale(self, key: tuple, target: str) -> Optional[httpx.Response]:
+        response = self._last_good.get(key)
+        if response is None:
+            return None
+        self._count(target, "stale_served")
+        return httpx.Response(response.status_code, headers=response.headers, content=response.content, request=response.request, extensions={"stale": True})
+
+    async def _send(self, target: str, url: str, params, headers, timeout) -> httpx.Response:
+        host = httpx.URL(url).host
+        slots = self._host_slots.setdefault(host, asyncio.Semaphore(self.per_host_limit))
+        request_timeout = httpx.Timeout(timeout, connect=self.timeout.connect) if timeout else httpx.USE_CLIENT_DEFAULT
+        for attempt in range(self.retries + 1):
+            if self.rate_limit > 0:
+                bucket = self._buckets.get(target)
+                if bucket is None:
+                    bucket = self._buckets[target] = TokenBucket(self.rate_limit, self.rate_burst)
+                if await bucket.acquire(): self._count(target, "throttled")
+            status, started = "error", time.perf_counter()
+            try:
+                async with slots:
+                    response = await self.client.get(url, params=params, headers=headers, timeout=request_timeout)
+                status = str(response.status_code)
+            except RETRYABLE_ERRORS:
+                if attempt >= self.retries: raise
+                response = None
+            finally:
+                UPSTREAM_SECONDS.observe(time.perf_counter() - started, target, status)
+                UPSTREAM_RESPONSES.inc(target, status)
+            if response is not None and (response.status_code not in RETRYABLE_STATUS or attempt >= self.retries):
+                return response
+            self._count(target, "retried")
+            await asyncio.sleep(self._backoff(attempt, response))
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.retry_max_delay)
+        return random.uniform(0, min(self.retry_max_delay, self.retry_backoff * 2 ** attempt))
+
+    def stats(self) -> Dict[str, Any]:
+        targets = set(self._breakers) | set(self.counts) | set(self._buckets)
+        return {
+            "inflight": len(self._inflight),
+            "last_good_entries": len(self._last_good),
+            "rate_limit_per_second": self.rate_limit,
+            "retries": self.retries,
+            "targets": {
+                target: {
+                    "breaker": self.breaker(target).stats(),
+                    "tokens": round(self._buckets[target].tokens, 2) if target in self._buckets else None,
+                    **self.counts.get(target, {}),
+                } for target in sorted(targets)
+            },
+        }
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+UPSTREAM = UpstreamClient(UPSTREAM_TIMEOUT, UPSTREAM_CONNECT_TIMEOUT, UPSTREAM_MAX_CONNECTIONS, UPSTREAM_MAX_KEEPALIVE, UPSTREAM_PER_HOST_LIMIT,
+                          rate_limit=UPSTREAM_RATE_LIMIT, rate_burst=UPSTREAM_RATE_BURST, retries=UPSTREAM_RETRIES,
+                          retry_backoff=UPSTREAM_RETRY_BACKOFF, retry_max_delay=UPSTREAM_RETRY_MAX_DELAY,
+                          breaker_failures=UPSTREAM_BREAKER_FAILURES, breaker_cooldown=UPSTREAM_BREAKER_COOLDOWN,
+                          stale_max_entries=UPSTREAM_STALE_MAX_ENTRIES)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if EVENTS_POLL_INTERVAL > 0 and not SNAPSHOT_SERVE:
+        EVENT_POLLER.start()
+    if SNAPSHOT_INTERVAL > 0 and not SNAPSHOT_SERVE:
+        SNAPSHOT_WRITER.start()
+    yield
+    await JOBS.stop()
+    await SNAPSHOT_WRITER.stop()
+    await EVENT_POLLER.stop()
+    await UPSTREAM.aclose()
+
+app = FastAPI(lifespan=lifespan, default_response_class=TimedJSONResponse)
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
+app.add_middleware(MetricsMiddleware, server_timing=SERVER_TIMING)
+
+@app.exception_handler(httpx.HTTPError)
+async def upstream_error_handler(request: Request, exc: httpx.HTTPError):
+    return JSONResponse(status_code=502, content={"detail": f"Upstream request failed: {exc}"})
+
+@app.exception_handler(UpstreamUnavailable)
+async def upstream_unavailable_handler(request: Request, exc: UpstreamUnavailable):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": str(max(1, round(exc.retry_after)))})
 
 # --- Pydantic Models ---
 class Club(BaseModel):
     club_name: str
     tier: str = "Iron"
     roster: List[int] = []
+
+class ClubView(Club):
+    summary: Optional[Dict[str, Any]] = None  # strength aggregates, see ClubSummaries
 class PlayerAssignmentRequest(BaseModel):
     player_id: int
     old_club_name: str
@@ -57,161 +969,950 @@ class SimulationRequest(BaseModel):
     player_ids: List[int]
     role_map: Dict[str, str]
     tier: str
+    solver: str = "greedy"  # 'greedy' (slot order) or 'optimal' (max total fit)
+
+class FormationRecommendRequest(BaseModel):
+    tier: str
+    player_ids: Optional[List[int]] = None   # default: club_name's roster, else the whole owned roster
+    club_name: Optional[str] = None
+    solver: str = "optimal"
+    formations: Optional[List[str]] = None   # default: every formation
+    roles: Optional[List[str]] = None        # candidate roles; default: every role of the slot's position
+    limit: Optional[int] = None              # formations returned, best first
+    include_squads: bool = True
+
+# --- Player & Listing Cache ---
+# Bounded LRU keyed by id. Entries are fresh for `ttl`; after that they are still returned at once
+# (up to `max_stale`) while one background task reloads them. Concurrent misses for the same key
+# share a single upstream call. Eviction is by an approximate byte budget (JSON size of the value).
+# Loaders raise on upstream errors, so failures are never cached; a None result (e.g. no listing) is.
+class AsyncLRUCache:
+    def __init__(self, loader, ttl: float, max_stale: float, max_bytes: int):
+        self.loader = loader
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Any, tuple]" = OrderedDict()  # key -> (value, size, stored_at)
+        self._inflight: Dict[Any, asyncio.Task] = {}
+        self._bytes = 0
+        self.hits = self.stale_hits = self.misses = self.coalesced = self.evictions = self.load_errors = 0
+
+    async def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry[2]
+            if age <= self.max_stale:
+                self._entries.move_to_end(key)
+                if age <= self.ttl:
+                    self.hits += 1
+                else:
+                    self.stale_hits += 1
+                    self._load(key)
+                return entry[0]
+        self.misses += 1
+        return await asyncio.shield(self._load(key))
+
+    def _load(self, key) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return task
+        task = background_task(self._run_loader(key))
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: t.exception() if not t.cancelled() else None)
+        return task
+
+    async def _run_loader(self, key):
+        try:
+            value = await self.loader(key)
+        except Exception:
+            self.load_errors += 1
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        self.put(key, value)
+        return value
+
+    def put(self, key, value):
+        self.invalidate(key)
+        size = len(json.dumps(value, default=str))
+        self._entries[key] = (value, size, time.monotonic())
+        self._bytes += size
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    def invalidate(self, key=None):
+        if key is None:
+            self._entries.clear()
+            self._bytes = 0
+            return
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "max_stale_seconds": self.max_stale,
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "load_errors": self.load_errors,
+        }
 
 # --- Data Fetch & Scoring ---
-def fetch_player_listing(player_id: int) -> Dict:
+async def load_player_listing(player_id: int) -> Optional[Dict]:
+    if SNAPSHOT_SERVE:
+        return SNAPSHOTS.listing_for_player(player_id)
+    r = await UPSTREAM.get(MARKETPLACE_API, params={"playerId": player_id}, timeout=UPSTREAM_LISTING_TIMEOUT)
+    r.raise_for_status()
+    listings = r.json()
+    return listings[0] if listings else None
+
+async def load_single_player(player_id: int) -> Optional[Dict]:
+    if SNAPSHOT_SERVE:
+        return SNAPSHOTS.player(player_id)
+    r = await UPSTREAM.get(f"{PLAYERS_API_BASE}/{player_id}", stale_ok=True)
+    r.raise_for_status()
+    return r.json().get("player") or None
+
+PLAYER_CACHE = AsyncLRUCache(load_single_player, PLAYER_CACHE_TTL, PLAYER_CACHE_MAX_STALE, PLAYER_CACHE_MAX_BYTES)
+LISTING_CACHE = AsyncLRUCache(load_player_listing, LISTING_CACHE_TTL, LISTING_CACHE_MAX_STALE, LISTING_CACHE_MAX_BYTES)
+
+# The listing only decorates the player card, so any failure (the breaker included) means "no listing".
+async def fetch_player_listing(player_id: int) -> Optional[Dict]:
     try:
-        r = requests.get(f"{MARKETPLACE_API}?playerId={player_id}", timeout=10)
-        r.raise_for_status()
-        listings = r.json()
-        return listings[0] if listings else None
-    except requests.exceptions.RequestException:
+        return await LISTING_CACHE.get(player_id)
+    except (UpstreamUnavailable, httpx.HTTPError, ValueError):
         return None
 
-def fetch_single_player(player_id: int, as_series=False):
+# Flatten an upstream player (id + metadata) into the roster row shape.
+def normalize_player(p: Dict) -> Dict[str, Any]:
+    m = p.get("metadata", {})
+    positions_raw = m.get("positions", [])
+    positions_norm = [(pos or "").strip().upper() for pos in positions_raw]
+    return { "id": int(p.get("id")), "firstName": m.get("firstName", ""), "lastName": m.get("lastName", ""),"age": m.get("age", 0), "positions": positions_norm, "overall": m.get("overall", 0), "pace": m.get("pace", 0), "shooting": m.get("shooting", 0), "passing": m.get("passing", 0), "dribbling": m.get("dribbling", 0), "defense": m.get("defense", 0), "physical": m.get("physical", 0), "goalkeeping": m.get("goalkeeping", 0) }
+
+async def fetch_single_player(player_id: int, as_series=False):
     try:
-        r = requests.get(f"{PLAYERS_API_BASE}/{player_id}", timeout=30)
-        r.raise_for_status()
-        data = r.json()
-        player_data = data.get("player")
+        player_data = await PLAYER_CACHE.get(player_id)
         if not player_data: return None
         if as_series:
-            m = player_data.get("metadata", {})
-            positions_raw = m.get("positions", [])
-            positions_norm = [(pos or "").strip().upper() for pos in positions_raw]
-            player_dict = { "id": player_data.get("id"), "firstName": m.get("firstName", ""), "lastName": m.get("lastName", ""),"age": m.get("age", 0), "positions": positions_norm, "overall": m.get("overall", 0), "pace": m.get("pace", 0), "shooting": m.get("shooting", 0), "passing": m.get("passing", 0), "dribbling": m.get("dribbling", 0), "defense": m.get("defense", 0), "physical": m.get("physical", 0), "goalkeeping": m.get("goalkeeping", 0) }
-            return pd.Series(player_dict)
+            return pd.Series(normalize_player(player_data))
         return player_data
-    except requests.exceptions.RequestException:
+    except UpstreamUnavailable:
+        raise
+    except (httpx.HTTPError, ValueError):
         return None
 
-def fetch_players() -> pd.DataFrame:
-    r = requests.get(PLAYERS_API_OWNED, timeout=30)
-    players = []
-    if r.ok:
+# Owned players as the upstream returns them. Raises on a failed or unreadable answer: an empty
+# list is a real (empty) roster, never an error.
+async def fetch_owned_raw() -> List[Dict]:
+    r = await UPSTREAM.get(PLAYERS_API_OWNED, stale_ok=True)
+    r.raise_for_status()
+    try:
+        data = r.json()
+    except ValueError as e:
+        raise httpx.DecodingError(f"Owned roster response is not JSON: {e}", request=r.request)
+    data_list = data if isinstance(data, list) else data.get("players", [])
+    return [p for p in data_list if p.get("id") is not None]
+
+async def fetch_players() -> pd.DataFrame:
+    return pd.DataFrame([normalize_player(p) for p in await fetch_owned_raw()])
+
+# --- Scoring Engine ---
+# ScoringEngine, the assignment solvers and recommend_formation live in scoring.py, which the job
+# worker processes import without the app. Scoring calls here count as the "scoring" phase.
+SCORING_ENGINE = ScoringEngine(ROLES_DATA, ROLE_LOOKUP, TIER_THRESH, ATTR_MAP, ATTRIBUTE_WEIGHTS, ROLE_DESCRIPTIONS,
+                               timer=lambda: timed("scoring"), count=lambda method, n: SCORED_EVALUATIONS.inc(method, amount=n))
+
+# --- Owned Roster Cache ---
+# The owned roster is fetched once and kept together with its derived best-fit columns. Within
+# the TTL it is served as-is; after that it is still served (stale-while-revalidate) while a
+# single background task refreshes it, until it is older than max_stale. A failing load is never
+# cached: a background refresh keeps the previous roster, an inline load raises to the caller.
+async def load_owned_roster() -> pd.DataFrame:
+    players_df = SNAPSHOTS.frame(SNAPSHOTS.resolve("roster")) if SNAPSHOT_SERVE else await fetch_players()
+    if players_df.empty:
+        return players_df
+    return pd.concat([players_df, SCORING_ENGINE.best_fit(players_df)], axis=1)
+
+class OwnedRosterCache:
+    def __init__(self, loader, ttl: float, max_stale: float):
+        self.loader = loader
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self._load_lock = asyncio.Lock()
+        self._players = None
+        self._loaded_at = 0.0
+        self._generation = 0
+        self._refresh_task: Optional[asyncio.Task] = None
+        self.version = 0  # bumped whenever the cached roster changes; part of roster ETags
+        self.listeners = []  # fn(players_df, delta) on every new roster; delta is None or (upserted records, removed ids)
+        self.hits = self.stale_hits = self.misses = self.refreshes = self.refresh_errors = 0
+
+    def _age(self) -> float:
+        return time.monotonic() - self._loaded_at
+
+    async def get(self) -> pd.DataFrame:
+        players, age = self._players, self._age()
+        if players is not None and age <= self.max_stale:
+            if age <= self.ttl:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+                self._start_refresh()
+            return players
+        self.misses += 1
+        return await self._load()
+
+    # Cached roster if usable, without loading, refreshing or counting; None when cold.
+    def peek(self) -> Optional[pd.DataFrame]:
+        if self._players is not None and self._age() <= self.max_stale:
+            return self._players
+        return None
+
+    # Start a background load when nothing usable is cached, for readers that must not wait on it.
+    def warm(self):
+        if self.peek() is None:
+            self._start_refresh()
+
+    async def invalidate(self, refresh: bool = False):
+        self._players = None
+        self._generation += 1
+        if refresh:
+            await self._load()
+
+    def stats(self) -> Dict[str, Any]:
+        loaded = self._players is not None
+        return {
+            "loaded": loaded,
+            "players": len(self._players) if loaded else 0,
+            "age_seconds": round(self._age(), 3) if loaded else None,
+            "ttl_seconds": self.ttl,
+            "max_stale_seconds": self.max_stale,
+            "refreshing": self._refresh_task is not None and not self._refresh_task.done(),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+        }
+
+    async def _load(self) -> pd.DataFrame:
+        # Only one inline load at a time; callers queued behind it reuse its result.
+        async with self._load_lock:
+            if self._players is not None and self._age() <= self.max_stale:
+                return self._players
+            generation = self._generation
+            players = await self.loader()
+            self._store(players, generation)
+            return players
+
+    def _store(self, players: pd.DataFrame, generation: int):
+        if generation != self._generation:
+            return  # invalidated while loading; let the next reader fetch again
+        self._players = players
+        self._loaded_at = time.monotonic()
+        self.version += 1
+        self.refreshes += 1
+        for listener in self.listeners:
+            listener(players, None)
+
+    # Patch the cached roster in place of a full reload: `players` are normalised rows to add or
+    # replace, `removed_ids` leave the roster. Only the patched rows are rescored. Returns False
+    # when nothing is cached (the next read loads a fresh roster anyway).
+    def apply_changes(self, players: List[Dict[str, Any]], removed_ids: List[int] = ()) -> bool:
+        current = self._players
+        if current is None:
+            return False
+        if current.empty and not players:
+            return True
+        patched_ids = set(removed_ids) | {p["id"] for p in players}
+        merged = current[~current['id'].isin(patched_ids)] if not current.empty else current
+        if players:
+            upserts = pd.DataFrame(players)
+            upserts = pd.concat([upserts, SCORING_ENGINE.best_fit(upserts)], axis=1)
+            merged = pd.concat([merged, upserts], ignore_index=True) if not merged.empty else upserts
+        # Keep the original row order; new players go last
+        position = {pid: n for n, pid in enumerate(current['id'].tolist())} if not current.empty else {}
+        merged = merged.iloc[np.argsort([position.get(pid, len(position)) for pid in merged['id'].tolist()], kind="stable")].reset_index(drop=True)
+        self._players = merged
+        self.version += 1
+        for listener in self.listeners:
+            listener(merged, (players, list(removed_ids)))
+        return True
+
+    def _start_refresh(self):
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return
+        self._refresh_task = background_task(self._refresh(self._generation))
+
+    async def _refresh(self, generation: int):
+        try:
+            self._store(await self.loader(), generation)
+        except Exception:
+            self.refresh_errors += 1
+
+OWNED_ROSTER = OwnedRosterCache(load_owned_roster, OWNED_CACHE_TTL, OWNED_CACHE_MAX_STALE)
+
+# --- Role Rank Index ---
+# For every (tier, role) a row order of the owned players sorted by fit, best first, holding only
+# players whose positions allow the role. It is built from the first roster the cache stores; later
+# rosters are diffed against it by attributes and positions so only new, changed and removed players
+# are re-sorted. Large diffs (or many dead rows) fall back to a full rebuild.
+class RoleRankIndex:
+    REBUILD_FRACTION = 0.25
+
+    def __init__(self, engine: ScoringEngine):
+        self.engine = engine
+        self._orders: Optional[List[List[np.ndarray]]] = None   # [tier][role] -> rows, best first
+        self._scores = np.zeros((0, len(engine.tiers), len(engine.role_names)), dtype=np.int32)
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._row: Dict[int, int] = {}
+        self._fingerprints: Dict[int, tuple] = {}
+        self._names: Dict[int, str] = {}
+        self.builds = self.updates = 0
+
+    def _fingerprint(self, player: Dict[str, Any]) -> tuple:
+        positions = player.get("positions")
+        positions = tuple(positions) if isinstance(positions, (list, tuple, np.ndarray)) else ()
+        return tuple(player.get(col) for col in self.engine.attr_columns) + (positions,)
+
+    def _score_rows(self, players: List[Dict[str, Any]]) -> np.ndarray:
+        attrs, usable = self.engine.compile_players(players)
+        raw = self.engine.raw_scores(attrs)
+        return np.where(usable[:, None, :], np.trunc(raw), -999).astype(np.int32)
+
+    def sync(self, players_df: pd.DataFrame, delta=None):
+        if delta is not None and self._orders is not None:
+            return self.apply(*delta)
+        records = players_df.to_dict("records") if not players_df.empty else []
+        if self._orders is None:
+            return self.rebuild(records)
+        current = {int(p["id"]): p for p in records}
+        removed = [pid for pid in self._row if pid not in current]
+        changed = [p for pid, p in current.items() if self._fingerprints.get(pid) != self._fingerprint(p)]
+        dead_rows = len(self._ids) - len(self._row)
+        if len(changed) + len(removed) + dead_rows > self.REBUILD_FRACTION * max(len(records), 1):
+            return self.rebuild(records)
+        self._names.update((int(p["id"]), f"{p.get('firstName', '')} {p.get('lastName', '')}".strip()) for p in records)
+        self.apply(changed, removed)
+
+    def rebuild(self, records: List[Dict[str, Any]]):
+        self._ids = np.array([int(p["id"]) for p in records], dtype=np.int64)
+        self._row = {pid: n for n, pid in enumerate(self._ids.tolist())}
+        self._fingerprints = {int(p["id"]): self._fingerprint(p) for p in records}
+        self._names = {int(p["id"]): f"{p.get('firstName', '')} {p.get('lastName', '')}".strip() for p in records}
+        self._scores = self._score_rows(records) if records else self._scores[:0]
+        # One stable argsort over every (tier, role) column; unusable rows (-999) sort last and are cut
+        order = np.argsort(-self._scores, axis=0, kind="stable")
+        usable_counts = (self._scores > -999).sum(axis=0)
+        self._orders = [[order[:usable_counts[t, r], t, r] for r in range(self._scores.shape[2])] for t in range(self._scores.shape[1])]
+        self.builds += 1
+
+    # Upsert `players` (new or changed) and drop `removed` ids, touching only their rows.
+    def apply(self, players: List[Dict[str, Any]], removed: List[int] = ()):
+        if self._orders is None:
+            return
+        removed_rows = [self._row.pop(pid) for pid in removed if pid in self._row]
+        for pid in removed:
+            self._fingerprints.pop(pid, None)
+            self._names.pop(pid, None)
+        rows = []
+        if players:
+            scores = self._score_rows(players)
+            new_players = [int(p["id"]) for p in players if int(p["id"]) not in self._row]
+            if new_players:
+                start = len(self._ids)
+                self._ids = np.concatenate([self._ids, np.array(new_players, dtype=np.int64)])
+                self._scores = np.concatenate([self._scores, np.zeros((len(new_players),) + self._scores.shape[1:], dtype=np.int32)])
+                self._row.update((pid, start + n) for n, pid in enumerate(new_players))
+            for player, player_scores in zip(players, scores):
+                pid = int(player["id"])
+                self._scores[self._row[pid]] = player_scores
+                self._fingerprints[pid] = self._fingerprint(player)
+                self._names[pid] = f"{player.get('firstName', '')} {player.get('lastName', '')}".strip()
+                rows.append(self._row[pid])
+        if not rows and not removed_rows:
+            return
+        rows = np.array(rows, dtype=np.int64)
+        touched = np.zeros(len(self._ids), dtype=bool)
+        touched[rows] = True
+        touched[removed_rows] = True
+        for t, tier_orders in enumerate(self._orders):
+            tier_scores = -self._scores[:, t, :]
+            for r, order in enumerate(tier_orders):
+                kept = order[~touched[order]]
+                new_rows = rows[tier_scores[rows, r] < 999]
+                if len(new_rows):
+                    new_rows = new_rows[np.argsort(tier_scores[new_rows, r], kind="stable")]
+                    at = np.searchsorted(tier_scores[kept, r], tier_scores[new_rows, r], side="right")
+                    kept = np.insert(kept, at, new_rows)
+                tier_orders[r] = kept
+        self.updates += 1
+
+    # Best players for one role at one tier. assignment: 'all', 'assigned' or 'unassigned'.
+    def top(self, role_name: str, tier: str, k: int, assignment: str = "all", club_of=None) -> List[Dict[str, Any]]:
+        j = self.engine.role_index.get((role_name or "").strip().upper())
+        if j is None or self._orders is None:
+            return []
+        t = self.engine.tier_row(tier)
+        results = []
+        for row in self._orders[t][j].tolist():
+            pid = int(self._ids[row])
+            club = club_of(pid) if club_of else None
+            if assignment == "assigned" and club is None: continue
+            if assignment == "unassigned" and club is not None: continue
+            score = int(self._scores[row, t, j])
+            results.append({"player_id": pid, "player_name": self._names.get(pid, ""), "score": score, "label": fit_label(score), "assigned_club": club or "Unassigned"})
+            if len(results) >= k: break
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        return {"built": self._orders is not None, "players": len(self._row), "builds": self.builds, "updates": self.updates}
+
+ROLE_RANK_INDEX = RoleRankIndex(SCORING_ENGINE)
+OWNED_ROSTER.listeners.append(ROLE_RANK_INDEX.sync)
+
+# --- Events Feed ---
+# Polls EVENTS_API_BASE from a cursor persisted in the squad store and turns each event into
+# targeted work: listing events drop the cached listing; anything else touching a player drops the
+# cached player and listing and, if the player is or becomes ours, refetches just that player and
+# patches the owned roster (and through it the role index). Work per poll scales with the number
+# of players mentioned, not the roster size. The first poll only records the newest cursor.
+def event_player_ids(event: Dict) -> List[int]:
+    payload = event.get("payload") if isinstance(event.get("payload"), dict) else {}
+    listing = event.get("listing") if isinstance(event.get("listing"), dict) else {}
+    candidates = [
+        event.get("playerId"), payload.get("playerId"),
+        (event.get("player") or {}).get("id"), (payload.get("player") or {}).get("id"),
+        (listing.get("player") or {}).get("id"),
+    ]
+    candidates += list(event.get("playerIds") or []) + list(payload.get("playerIds") or [])
+    ids = []
+    for candidate in candidates:
+        try:
+            if candidate is not None and int(candidate) not in ids: ids.append(int(candidate))
+        except (TypeError, ValueError):
+            continue
+    return ids
+
+def is_listing_only_event(event_type: str) -> bool:
+    # Price/status changes of a listing; sales move ownership and are handled as player changes
+    return "LISTING" in event_type and not any(word in event_type for word in ("SOLD", "SALE", "PURCHASE", "BOUGHT"))
+
+def player_owner(player_data: Dict) -> Optional[str]:
+    owner = (player_data.get("ownedBy") or {}).get("walletAddress") if isinstance(player_data.get("ownedBy"), dict) else None
+    return owner or player_data.get("ownerWalletAddress")
+
+class EventPoller:
+    CURSOR_KEY = "events_cursor"
+
+    def __init__(self, store: SquadStore, interval: float, page_size: int, max_pages: int):
+        self.store = store
+        self.interval = interval
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self._task: Optional[asyncio.Task] = None
+        self._poll_lock = asyncio.Lock()
+        self.polls = self.events = self.errors = 0
+        self.last_poll: Optional[Dict[str, Any]] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = background_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.poll_once()
+            except Exception:
+                self.errors += 1
+            await asyncio.sleep(self.interval)
+
+    async def _fetch_page(self, cursor: Optional[str]) -> List[Dict]:
+        params: Dict[str, Any] = {"limit": self.page_size}
+        if cursor is not None:
+            params[EVENTS_CURSOR_PARAM] = cursor
+        r = await UPSTREAM.get(EVENTS_API_BASE, params=params)
+        r.raise_for_status()
         data = r.json()
-        data_list = data if isinstance(data, list) else data.get("players", [])
-        for p in data_list:
-            player_id = p.get("id")
-            if player_id is None: continue
-            m = p.get("metadata", {})
-            positions_raw = m.get("positions", [])
-            positions_norm = [(pos or "").strip().upper() for pos in positions_raw]
-            players.append({ "id": int(player_id), "firstName": m.get("firstName", ""), "lastName": m.get("lastName", ""),"age": m.get("age", 0), "positions": positions_norm, "overall": m.get("overall", 0), "pace": m.get("pace", 0), "shooting": m.get("shooting", 0), "passing": m.get("passing", 0), "dribbling": m.get("dribbling", 0), "defense": m.get("defense", 0), "physical": m.get("physical", 0), "goalkeeping": m.get("goalkeeping", 0) })
-    return pd.DataFrame(players)
-
-def calc_fit(player: pd.Series, role_name: str, tier: str):
-    role_key = (role_name or "").strip().upper()
-    role = ROLE_LOOKUP.get(role_key)
-    if not role: return -999, "Unknown", ""
-    thresholds = TIER_THRESH.get(tier, TIER_THRESH["Iron"])
-    need_pos = (role.get("Position", "") or "").strip().upper()
-    player_pos = {(p or "").strip().upper() for p in (player.get("positions") or [])}
-    if need_pos and need_pos not in player_pos: return -999, "Unusable", ""
-    score = 0
-    for i, attr_field in enumerate(["Attribute1", "Attribute2", "Attribute3", "Attribute4"]):
-        code = (role.get(attr_field) or "").strip().upper()
-        if not code: continue
-        player_attr_col = ATTR_MAP.get(code)
-        if not player_attr_col: continue
-        val = player.get(player_attr_col, 0) or 0
-        score += (val - thresholds[i]) * ATTRIBUTE_WEIGHTS[i]
-    label = ( "Elite" if score >= 50 else "Strong" if score >= 20 else "Natural" if score >= 0  else "Weak" if score >= -20 else "Unusable" )
-    description = ROLE_DESCRIPTIONS.get(role_key, "No description available.")
-    return int(score), label, description
-
-def calculate_best_role_for_player(player_series: pd.Series) -> pd.Series:
-    sorted_tiers = list(TIER_THRESH.keys())
-    player_pos = {(p or "").strip().upper() for p in (player_series.get("positions") or [])}
-    
-    for tier in sorted_tiers:
-        best_role_for_tier = None
-        max_score_for_tier = -1
-
-        for role_data in ROLES_DATA:
-            role_name = (role_data.get("Role") or role_data.get("RoleType") or "").strip().upper()
-            if not role_name: continue
-
-            role_info = ROLE_LOOKUP.get(role_name)
-            if not role_info:
+        events = data if isinstance(data, list) else (data or {}).get("events", [])
+        events = [e for e in events if isinstance(e, dict) and e.get("id") is not None]
+        # Oldest first, whatever order the feed uses
+        return sorted(events, key=lambda e: self.event_order(e["id"]))
+
+    # Numeric ids compare as numbers, anything else after them as text.
+    @staticmethod
+    def event_order(event_id: Any) -> tuple:
+        text = str(event_id)
+        return (not text.isdigit(), int(text) if text.isdigit() else 0, text)
+
+    async def poll_once(self) -> Dict[str, Any]:
+        async with self._poll_lock:
+            cursor = self.store.get_meta(self.CURSOR_KEY)
+            after = self.event_order(cursor) if cursor is not None else None
+            events: List[Dict] = []
+            seen = set()
+            for _ in range(self.max_pages):
+                page = await self._fetch_page(cursor if not events else str(events[-1]["id"]))
+                # A feed that treats the cursor as inclusive (or ignores it) repeats events; keep only new ones
+                fresh = [e for e in page if str(e["id"]) not in seen and (after is None or self.event_order(e["id"]) > after)]
+                seen.update(str(e["id"]) for e in fresh)
+                events += fresh
+                if cursor is None or len(page) < self.page_size or not fresh:
+                    break
+            summary: Dict[str, Any] = {"events": len(events), "listings_invalidated": 0, "players_invalidated": 0, "roster_updated": 0, "roster_removed": 0}
+            if events and cursor is None:
+                summary["baseline"] = True
+            elif events:
+                summary.update(await self.apply(events))
+            if events:
+                self.store.set_meta(self.CURSOR_KEY, str(events[-1]["id"]))
+            self.polls += 1
+            self.events += len(events)
+            summary["cursor"] = self.store.get_meta(self.CURSOR_KEY)
+            self.last_poll = {**summary, "at": time.time()}
+            return summary
+
+    async def apply(self, events: List[Dict]) -> Dict[str, int]:
+        listing_ids, player_ids = set(), set()
+        for event in events:
+            ids = event_player_ids(event)
+            listing_ids.update(ids)
+            if not is_listing_only_event(str(event.get("type") or "").upper()):
+                player_ids.update(ids)
+        for pid in listing_ids:
+            LISTING_CACHE.invalidate(pid)
+        for pid in player_ids:
+            PLAYER_CACHE.invalidate(pid)
+
+        updated, removed = [], []
+        owned = OWNED_ROSTER.peek()
+        if owned is not None and player_ids:
+            owned_ids = set(owned['id'].tolist()) if not owned.empty else set()
+            ordered = sorted(player_ids)
+            fresh = await asyncio.gather(*(fetch_single_player(pid) for pid in ordered))
+            for pid, player_data in zip(ordered, fresh):
+                if not player_data:
+                    continue
+                owner = player_owner(player_data)
+                if owner is not None and owner.lower() != OWNER_WALLET.lower():
+                    if pid in owned_ids: removed.append(pid)
+                elif owner is not None or pid in owned_ids:
+                    updated.append(normalize_player(player_data))
+            if updated or removed:
+                OWNED_ROSTER.apply_changes(updated, removed)
+        return {"listings_invalidated": len(listing_ids), "players_invalidated": len(player_ids), "roster_updated": len(updated), "roster_removed": len(removed)}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "interval_seconds": self.interval,
+            "cursor": self.store.get_meta(self.CURSOR_KEY),
+            "polls": self.polls,
+            "events": self.events,
+            "errors": self.errors,
+            "last_poll": self.last_poll,
+        }
+
+EVENT_POLLER = EventPoller(SQUAD_STORE, EVENTS_POLL_INTERVAL, EVENTS_PAGE_SIZE, EVENTS_MAX_PAGES)
+
+# --- Snapshots ---
+# Point-in-time copies of the owned roster and the marketplace listings, one Arrow IPC file per
+# snapshot (<kind>-<UTC timestamp>.arrow, uncompressed so it can be memory-mapped). Each row keeps
+# the normalised player columns used for filtering and diffing plus the upstream JSON in `raw`,
+# so served players and listings look exactly like live ones. Files are opened with a memory map
+# and read zero-copy into Arrow; only the DataFrame view is materialised, once per file.
+# With SNAPSHOT_SERVE=1 the roster, player, listing and market reads come from the latest
+# snapshots and the events poller stays off, so the app runs without the upstream API.
+SNAPSHOT_KINDS = ("roster", "listings")
+SNAPSHOT_DIFF_FIELDS = {
+    "roster": ["firstName", "lastName", "age", "overall", "positions", "pace", "shooting", "passing", "dribbling", "defense", "physical", "goalkeeping"],
+    "listings": ["status", "price", "overall", "pace", "shooting", "passing", "dribbling", "defense", "physical", "goalkeeping"],
+}
+SNAPSHOT_KEYS = {"roster": "id", "listings": "listingResourceId"}
+
+class SnapshotUnavailable(Exception):
+    pass
+
+class SnapshotStore:
+    CACHED_FILES = 8
+
+    def __init__(self, directory: str, keep: int):
+        self.directory = directory
+        self.keep = keep
+        self._tables: "OrderedDict[str, tuple]" = OrderedDict()  # snapshot id -> (memory map, table, DataFrame or None)
+
+    def _path(self, snapshot_id: str) -> str:
+        return os.path.join(self.directory, f"{snapshot_id}.arrow")
+
+    # Newest first; ids sort by time within a kind.
+    def list_snapshots(self, kind: Optional[str] = None) -> List[Dict[str, Any]]:
+        if not os.path.isdir(self.directory):
+            return []
+        snapshots = []
+        for name in sorted(os.listdir(self.directory), reverse=True):
+            snapshot_kind, _, stamp = name[:-len(".arrow")].partition("-")
+            if not name.endswith(".arrow") or snapshot_kind not in SNAPSHOT_KINDS or (kind and snapshot_kind != kind):
                 continue
-            
-            required_pos = (role_info.get("Position", "") or "").strip().upper()
-            if required_pos and required_pos not in player_pos:
+            try:
+                taken_at = datetime.strptime(stamp, "%Y%m%dT%H%M%S%fZ").replace(tzinfo=timezone.utc)
+            except ValueError:
+                continue  # not one of ours (a copy, a renamed file); skip it rather than fail the listing
+            snapshots.append({
+                "id": name[:-len(".arrow")],
+                "kind": snapshot_kind,
+                "taken_at": taken_at.isoformat(),
+                "bytes": os.path.getsize(os.path.join(self.directory, name)),
+            })
+        return snapshots
+
+    # "latest", a snapshot id, or an ISO date/datetime (the last snapshot taken at or before it;
+    # a bare date means the end of that day).
+    def resolve(self, kind: str, ref: Optional[str] = None) -> str:
+        snapshots = self.list_snapshots(kind)
+        if not snapshots:
+            raise SnapshotUnavailable(f"No {kind} snapshot available")
+        if not ref or ref == "latest":
+            return snapshots[0]["id"]
+        if any(s["id"] == ref for s in snapshots):
+            return ref
+        try:
+            moment = datetime.fromisoformat(ref)
+        except ValueError:
+            raise SnapshotUnavailable(f"Unknown {kind} snapshot '{ref}'")
+        if len(ref) == 10:
+            moment += timedelta(days=1) - timedelta(microseconds=1)
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        for snapshot in snapshots:
+            if datetime.fromisoformat(snapshot["taken_at"]) <= moment:
+                return snapshot["id"]
+        raise SnapshotUnavailable(f"No {kind} snapshot at or before {ref}")
+
+    def write(self, kind: str, rows: List[Dict[str, Any]], raw: List[bytes]) -> Dict[str, Any]:
+        os.makedirs(self.directory, exist_ok=True)
+        taken_at = datetime.now(timezone.utc)
+        snapshot_id = f"{kind}-{taken_at.strftime('%Y%m%dT%H%M%S%fZ')}"
+        with timed("persistence"):
+            table = pa.Table.from_pandas(pd.DataFrame(rows), preserve_index=False) if rows else pa.table({})
+            table = table.append_column("raw", pa.array(raw, type=pa.binary()))
+            table = table.replace_schema_metadata({"kind": kind, "taken_at": taken_at.isoformat()})
+            tmp_path = self._path(snapshot_id) + ".tmp"
+            with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            os.replace(tmp_path, self._path(snapshot_id))
+        for old in self.list_snapshots(kind)[self.keep:]:
+            self._tables.pop(old["id"], None)
+            os.remove(self._path(old["id"]))
+        return {"id": snapshot_id, "kind": kind, "taken_at": taken_at.isoformat(), "rows": len(rows), "bytes": os.path.getsize(self._path(snapshot_id))}
+
+    def table(self, snapshot_id: str):
+        entry = self._tables.get(snapshot_id)
+        if entry is None:
+            if not os.path.exists(self._path(snapshot_id)):
+                raise SnapshotUnavailable(f"Unknown snapshot '{snapshot_id}'")
+            source = pa.memory_map(self._path(snapshot_id), "r")
+            entry = (source, pa.ipc.open_file(source).read_all(), None)
+            self._tables[snapshot_id] = entry
+            while len(self._tables) > self.CACHED_FILES:
+                self._tables.popitem(last=False)
+        self._tables.move_to_end(snapshot_id)
+        return entry[1]
+
+    # DataFrame of a snapshot without the raw JSON; row n matches row n of table().
+    def frame(self, snapshot_id: str) -> pd.DataFrame:
+        table = self.table(snapshot_id)
+        source, _, df = self._tables[snapshot_id]
+        if df is None:
+            df = table.drop_columns(["raw"]).to_pandas() if table.num_columns > 1 else pd.DataFrame()
+            if "positions" in df:
+                df["positions"] = df["positions"].map(lambda ps: list(ps) if ps is not None else [])
+            self._tables[snapshot_id] = (source, table, df)
+        return df
+
+    def raw(self, snapshot_id: str, rows) -> List[Dict]:
+        column = self.table(snapshot_id).column("raw")
+        return [orjson.loads(column[int(row)].as_py()) for row in rows]
+
+    def player(self, player_id: int) -> Optional[Dict]:
+        for kind, column in (("roster", "id"), ("listings", "id")):
+            try:
+                snapshot_id = self.resolve(kind)
+            except SnapshotUnavailable:
                 continue
-            
-            score, label, _ = calc_fit(player_series, role_name, tier)
-            
-            if score > max_score_for_tier:
-                max_score_for_tier = score
-                best_role_for_tier = role_name
-        
-        if max_score_for_tier >= 0:
-            return pd.Series([tier, best_role_for_tier], index=['bestTier', 'bestRole'])
-
-    return pd.Series(["Unrated", "N/A"], index=['bestTier', 'bestRole'])
+            df = self.frame(snapshot_id)
+            rows = np.flatnonzero(df[column].to_numpy() == player_id) if column in df else []
+            if len(rows):
+                record = self.raw(snapshot_id, rows[:1])[0]
+                return record if kind == "roster" else record.get("player")
+        return None
+
+    def listing_for_player(self, player_id: int) -> Optional[Dict]:
+        try:
+            snapshot_id = self.resolve("listings")
+        except SnapshotUnavailable:
+            return None
+        df = self.frame(snapshot_id)
+        rows = np.flatnonzero(df["id"].to_numpy() == player_id) if "id" in df else []
+        return self.raw(snapshot_id, rows[:1])[0] if len(rows) else None
+
+    # One page of the listings API answered from the latest listings snapshot.
+    def market_page(self, params: Dict[str, Any]) -> List[Dict]:
+        snapshot_id = self.resolve("listings")
+        df = self.frame(snapshot_id)
+        if df.empty:
+            return []
+        keep = np.ones(len(df), dtype=bool)
+        if params.get("status") and "status" in df:
+            keep &= (df["status"] == params["status"]).to_numpy()
+        if params.get("positions"):
+            wanted = {p.strip().upper() for p in str(params["positions"]).split(",") if p.strip()}
+            keep &= np.array([not wanted.isdisjoint(ps) for ps in df["positions"]], dtype=bool)
+        for attr in MARKET_FILTER_ATTRS:
+            minimum = params.get(f"{attr}Min")
+            if minimum is not None:
+                keep &= pd.to_numeric(df[attr], errors="coerce").fillna(0).to_numpy() >= float(minimum)
+        rows = np.flatnonzero(keep)
+        if params.get("sorts") == "listing.price":
+            prices = pd.to_numeric(df["price"], errors="coerce").to_numpy()[rows]
+            order = np.argsort(-prices if str(params.get("sortsOrders", "")).upper() == "DESC" else prices, kind="stable")
+            rows = rows[order]
+        offset = int(params.get(MARKET_PAGE_OFFSET_PARAM) or 0)
+        limit = int(params.get("limit") or MARKET_PAGE_SIZE)
+        return self.raw(snapshot_id, rows[offset:offset + limit])
+
+    # Rows added, removed and changed (per field: [old, new]) between two snapshots of one kind.
+    def diff(self, kind: str, old_id: str, new_id: str, fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        key = SNAPSHOT_KEYS[kind]
+        old_df, new_df = self.frame(old_id), self.frame(new_id)
+        fields = [f for f in (fields or SNAPSHOT_DIFF_FIELDS[kind]) if f in old_df.columns and f in new_df.columns]
+        old_keys = set(old_df[key].tolist()) if key in old_df else set()
+        new_keys = set(new_df[key].tolist()) if key in new_df else set()
+        common = old_df[old_df[key].isin(new_keys)][[key] + fields].merge(new_df[new_df[key].isin(old_keys)][[key] + fields], on=key, suffixes=("_old", "_new")) if old_keys & new_keys else pd.DataFrame()
+        changed = []
+        if not common.empty:
+            masks = {}
+            for field in fields:
+                old_values, new_values = common[f"{field}_old"], common[f"{field}_new"]
+                if field == "positions":
+                    masks[field] = np.array([list(a) != list(b) for a, b in zip(old_values, new_values)], dtype=bool)
+                else:
+                    masks[field] = (old_values != new_values).to_numpy() & ~(old_values.isna() & new_values.isna()).to_numpy()
+            any_change = np.logical_or.reduce(list(masks.values())) if masks else np.zeros(len(common), dtype=bool)
+            for row in np.flatnonzero(any_change):
+                record = common.iloc[row]
+                changes = {f: [record[f"{f}_old"], record[f"{f}_new"]] for f in fields if masks[f][row]}
+                changed.append({key: record[key], "changes": changes})
+        return {
+            "kind": kind,
+            "from": old_id,
+            "to": new_id,
+            "added": sorted(new_keys - old_keys),
+            "removed": sorted(old_keys - new_keys),
+            "changed": changed,
+        }
+
+SNAPSHOTS = SnapshotStore(SNAPSHOT_DIR, SNAPSHOT_KEEP)
+
+async def take_snapshot(kind: str, auth_token: Optional[str] = None, max_pages: Optional[int] = None) -> Dict[str, Any]:
+    if kind == "roster":
+        players = await fetch_owned_raw()
+        return SNAPSHOTS.write(kind, [normalize_player(p) for p in players], [orjson.dumps(p) for p in players])
+    params = {"limit": MARKET_PAGE_SIZE, "type": "PLAYER", "status": "AVAILABLE", "view": "full"}
+    listings, _ = await fetch_market_listings(auth_token or SNAPSHOT_AUTH_TOKEN, params, MARKET_PAGE_SIZE, max(1, min(max_pages or SNAPSHOT_MARKET_MAX_PAGES, SNAPSHOT_MARKET_MAX_PAGES)))
+    candidates = listing_candidates(listings)
+    rows = [{
+        "listingResourceId": listing.get("listingResourceId"),
+        "status": listing.get("status"),
+        "price": listing.get("price"),
+        "sellerAddress": listing.get("sellerAddress"),
+        "createdDateTime": listing.get("createdDateTime"),
+        **player_dict,
+    } for listing, player_dict in candidates]
+    return SNAPSHOTS.write(kind, rows, [orjson.dumps(listing) for listing, _ in candidates])
+
+class SnapshotWriter:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.runs = self.errors = 0
+
+    def start(self):
+        if pa is not None and (self._task is None or self._task.done()):
+            self._task = background_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            for kind in SNAPSHOT_KINDS:
+                try:
+                    await take_snapshot(kind)
+                    self.runs += 1
+                except Exception:
+                    self.errors += 1
+            await asyncio.sleep(self.interval)
+
+SNAPSHOT_WRITER = SnapshotWriter(SNAPSHOT_INTERVAL)
+if SNAPSHOT_SERVE and pa is None:
+    raise RuntimeError("SNAPSHOT_SERVE=1 needs pyarrow installed")
+
+@app.exception_handler(SnapshotUnavailable)
+async def snapshot_unavailable_handler(request: Request, exc: SnapshotUnavailable):
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
+
+# --- Roster Serialization ---
+# Roster endpoints encode once, straight from the DataFrame, with orjson. Clients pick a format
+# with ?format= or the Accept header:
+#   records  application/json                         list of player objects (default)
+#   columns  application/vnd.mflwebapp.columns+json   {"length": n, "columns": {name: [values]}}
+#   msgpack  application/x-msgpack                    records as MessagePack (needs msgpack)
+# Bodies are gzip/br compressed when the client accepts it. The ETag is derived from the roster
+# and squad store versions, so a matching If-None-Match is answered with 304 before any encoding,
+# and encoded bodies are memoised per (ETag, encoding) until the data changes.
+ROSTER_MEDIA_TYPES = {
+    "records": "application/json",
+    "columns": "application/vnd.mflwebapp.columns+json",
+    "msgpack": "application/x-msgpack",
+}
+ENCODED_RESPONSES: "OrderedDict[tuple, tuple]" = OrderedDict()  # (etag, encoding) -> (body, applied encoding)
+ENCODED_RESPONSES_MAX = 32
+ETAG_EPOCH = format(time.time_ns(), "x")  # versions restart with the process; keep their ETags apart
+
+def negotiate_roster_format(request: Request, fmt: Optional[str]) -> str:
+    if fmt is None:
+        accept = request.headers.get("accept", "")
+        fmt = next((name for name, media in ROSTER_MEDIA_TYPES.items() if name != "records" and media in accept), "records")
+    if fmt not in ROSTER_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(ROSTER_MEDIA_TYPES)}")
+    if fmt == "msgpack" and msgpack is None:
+        raise HTTPException(status_code=406, detail="MessagePack is not available on this server")
+    return fmt
+
+def encode_roster(players_df: pd.DataFrame, fmt: str) -> bytes:
+    if fmt == "columns":
+        columns = {col: players_df[col].tolist() for col in players_df.columns}
+        return orjson.dumps({"length": len(players_df), "columns": columns}, option=orjson.OPT_SERIALIZE_NUMPY)
+    records = players_df.to_dict("records")
+    if fmt == "msgpack":
+        return msgpack.packb(records, use_bin_type=True)
+    return orjson.dumps(records, option=orjson.OPT_SERIALIZE_NUMPY)
+
+def choose_encoding(request: Request) -> str:
+    accepted = {part.split(";")[0].strip().lower() for part in request.headers.get("accept-encoding", "").split(",")}
+    if brotli is not None and "br" in accepted: return "br"
+    if "gzip" in accepted: return "gzip"
+    return "identity"
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+    if encoding == "br": return brotli.compress(body, quality=4)
+    if encoding == "gzip": return gzip.compress(body, compresslevel=5)
+    return body
+
+def roster_response(request: Request, key: str, build, fmt: Optional[str]) -> Response:
+    fmt = negotiate_roster_format(request, fmt)
+    etag = f'W/"{ETAG_EPOCH}-{key}-{fmt}"'
+    headers = {"ETag": etag, "Vary": "Accept, Accept-Encoding"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+
+    encoding = choose_encoding(request)
+    cached = ENCODED_RESPONSES.get((etag, encoding))
+    if cached is None:
+        identity = ENCODED_RESPONSES.get((etag, "identity"))
+        players_df = None if identity else build()
+        with timed("serialization"):
+            raw = identity[0] if identity else encode_roster(players_df, fmt)
+            applied = encoding if len(raw) >= RESPONSE_COMPRESS_MIN_BYTES else "identity"
+            cached = (compress_body(raw, applied), applied)
+        ENCODED_RESPONSES[(etag, "identity")] = (raw, "identity")
+        ENCODED_RESPONSES[(etag, encoding)] = cached
+        while len(ENCODED_RESPONSES) > ENCODED_RESPONSES_MAX:
+            ENCODED_RESPONSES.popitem(last=False)
+    body, applied = cached
+    if applied != "identity":
+        headers["Content-Encoding"] = applied
+    return Response(content=body, media_type=ROSTER_MEDIA_TYPES[fmt], headers=headers)
 
 # --- Endpoints ---
 @app.get("/roles")
-def get_roles():
+async def get_roles():
     return ROLES_DATA
 
 @app.get("/formations")
-def get_formations():
+async def get_formations():
     return FORMATION_MAPS
 
 @app.get("/formation/{formation_name}")
-def get_formation_map(formation_name: str):
+async def get_formation_map(formation_name: str):
     if formation_name in FORMATION_MAPS:
         return FORMATION_MAPS[formation_name]
     raise HTTPException(status_code=404, detail="Formation not found")
 
 @app.get("/clubs/{club_name}")
-def get_club_by_name(club_name: str):
-    squads_data = load_squads()
-    if club_name in squads_data:
-        club_data = squads_data[club_name]
-        if isinstance(club_data, dict):
-            return club_data
-        elif isinstance(club_data, list):
-            return {
-                "club_name": club_name,
-                "tier": "Iron",
-                "roster": club_data
-            }
+async def get_club_by_name(club_name: str, summary: bool = True):
+    club_data = SQUAD_STORE.get_club(club_name)
+    if club_data is not None:
+        if summary:
+            CLUB_SUMMARIES.update()
+            club_data["summary"] = CLUB_SUMMARIES.get(club_name)
+        return club_data
     raise HTTPException(status_code=404, detail="Club not found")
 
 @app.put("/clubs/{club_name}")
-def update_club_roster(club_name: str, roster: List[int] = Body(...)):
-    squads_data = load_squads()
-    if club_name in squads_data:
-        if isinstance(squads_data[club_name], dict):
-            squads_data[club_name]["roster"] = roster
-        elif isinstance(squads_data[club_name], list):
-            squads_data[club_name] = roster
-        save_squads(squads_data)
+async def update_club_roster(club_name: str, roster: List[int] = Body(...)):
+    try:
+        updated = SQUAD_STORE.set_roster(club_name, roster)
+    except RosterConflict as e:
+        raise HTTPException(status_code=409, detail={"message": "Players already belong to another club", "conflicts": e.conflicts})
+    if updated:
         return {"message": f"Roster for {club_name} updated successfully."}
     raise HTTPException(status_code=404, detail="Club not found")
 
 @app.delete("/clubs/{club_name}")
-def delete_club(club_name: str):
-    squads_data = load_squads()
-    if club_name in squads_data:
-        del squads_data[club_name]
-        save_squads(squads_data)
+async def delete_club(club_name: str):
+    if SQUAD_STORE.delete_club(club_name):
         return {"message": f"Club {club_name} deleted successfully."}
     raise HTTPException(status_code=404, detail="Club not found")
 @app.get("/tiers")
-def get_tiers():
+async def get_tiers():
     return {"tiers": TIER_THRESH}
 
 @app.get("/player/{player_id}/card-analysis")
-def get_player_card_analysis(player_id: int):
-    player_data = fetch_single_player(player_id, as_series=False)
+async def get_player_card_analysis(player_id: int):
+    # Player and listing are independent; fetch them concurrently
+    player_data, listing_data = await asyncio.gather(fetch_single_player(player_id, as_series=False), fetch_player_listing(player_id))
     if not player_data:
         raise HTTPException(status_code=404, detail="Player not found")
 
-    listing_data = fetch_player_listing(player_id)
     nationality = player_data.get("metadata", {}).get("nationalities", [None])[0]
     country_code = COUNTRY_CODES.get(nationality, "")
 
@@ -225,35 +1926,11 @@ def get_player_card_analysis(player_id: int):
     return response
 
 @app.get("/player/{player_id}/role-analysis")
-def get_player_role_analysis(player_id: int):
-    player_series = fetch_single_player(player_id, as_series=True)
+async def get_player_role_analysis(player_id: int):
+    player_series = await fetch_single_player(player_id, as_series=True)
     if player_series is None or player_series.empty: raise HTTPException(status_code=404, detail="Player not found")
 
-    all_positive_roles_by_tier = {}
-    overall_best_role = None
-
-    for tier_name in TIER_THRESH.keys():
-        all_role_scores_for_tier = []
-        for role_data in ROLES_DATA:
-            role_name = (role_data.get("Role") or role_data.get("RoleType") or "").strip().upper()
-            score, label, description = calc_fit(player_series, role_name, tier_name)
-            if label != "Unusable":
-                all_role_scores_for_tier.append({
-                    "role": role_name,
-                    "score": score,
-                    "label": label,
-                    "description": description,
-                    "position": role_data.get("Position", ""),
-                    "tier": tier_name
-                })
-        
-        all_role_scores_for_tier.sort(key=lambda x: x["score"], reverse=True)
-        positive_roles_for_tier = [r for r in all_role_scores_for_tier if r["score"] >= 0]
-        
-        if positive_roles_for_tier:
-            all_positive_roles_by_tier[tier_name] = positive_roles_for_tier
-            if overall_best_role is None:
-                overall_best_role = positive_roles_for_tier[0]
+    overall_best_role, all_positive_roles_by_tier = SCORING_ENGINE.role_analysis([player_series])[0]
 
     return {
         "player_attributes": player_series.to_dict(),
@@ -261,96 +1938,244 @@ def get_player_role_analysis(player_id: int):
         "all_positive_roles_by_tier": all_positive_roles_by_tier
     }
 
+def check_tiers(tiers: Optional[List[str]]):
+    unknown_tiers = [t for t in tiers or [] if t not in TIER_THRESH]
+    if unknown_tiers:
+        raise HTTPException(status_code=400, detail=f"Unknown tiers: {', '.join(unknown_tiers)}")
+
+def check_roles(roles: Optional[List[str]]):
+    unknown_roles = [r for r in roles or [] if (r or "").strip().upper() not in ROLE_LOOKUP]
+    if unknown_roles:
+        raise HTTPException(status_code=400, detail=f"Unknown roles: {', '.join(unknown_roles)}")
+
+class RoleAnalysisBatchRequest(BaseModel):
+    player_ids: List[int]
+    tiers: Optional[List[str]] = None           # default: every tier
+    roles: Optional[List[str]] = None           # default: every role
+    max_roles_per_tier: Optional[int] = None
+    include_attributes: bool = False
+
+@app.post("/players/role-analysis/batch")
+async def get_players_role_analysis_batch(req: RoleAnalysisBatchRequest):
+    player_ids = list(dict.fromkeys(req.player_ids))
+    if len(player_ids) > ROLE_ANALYSIS_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {ROLE_ANALYSIS_BATCH_MAX} players per batch.")
+    check_tiers(req.tiers)
+    check_roles(req.roles)
+
+    players = await load_analysis_players(player_ids)
+    found = [pid for pid in player_ids if pid in players]
+    analyses = SCORING_ENGINE.role_analysis([players[pid] for pid in found], tiers=req.tiers, roles=req.roles, limit=req.max_roles_per_tier) if found else []
+    results = [analysis_entry(pid, analysis, players[pid], req.include_attributes) for pid, analysis in zip(found, analyses)]
+    return {"players": results, "not_found": [pid for pid in player_ids if pid not in players]}
+
+# Owned players come from the cached roster; the rest are fetched concurrently
+async def load_analysis_players(player_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    players: Dict[int, Dict[str, Any]] = {}
+    owned_df = OWNED_ROSTER.peek()
+    if owned_df is not None and not owned_df.empty:
+        owned_rows = owned_df[owned_df['id'].isin(player_ids)].drop(columns=["bestTier", "bestRole"], errors="ignore")
+        players.update((int(p["id"]), p) for p in owned_rows.to_dict("records"))
+    missing = [pid for pid in player_ids if pid not in players]
+    fetched = await asyncio.gather(*(fetch_single_player(pid, as_series=True) for pid in missing))
+    for pid, player_series in zip(missing, fetched):
+        if player_series is not None and not player_series.empty:
+            players[pid] = player_series.to_dict()
+    return players
+
+def analysis_entry(player_id: int, analysis: tuple, player: Dict[str, Any], include_attributes: bool) -> Dict[str, Any]:
+    overall_best_role, all_positive_roles_by_tier = analysis
+    entry = {
+        "player_id": player_id,
+        "overall_best_role": overall_best_role,
+        "all_positive_roles_by_tier": all_positive_roles_by_tier
+    }
+    if include_attributes:
+        entry["player_attributes"] = player
+    return entry
+
 @app.get("/players/owned")
-def get_owned_players_with_club_assignment():
-    players_df = fetch_players()
+async def get_owned_players_with_club_assignment(request: Request, format: Optional[str] = None):
+    players_df = await OWNED_ROSTER.get()
     if players_df.empty:
         return []
 
-    sorted_tiers = list(TIER_THRESH.keys())
+    def build():
+        assigned_df = players_df.copy()
+        player_to_club_map = SQUAD_STORE.player_club_map()
+        assigned_df['assigned_club'] = assigned_df['id'].map(player_to_club_map).fillna("Unassigned")
+        return assigned_df
 
-    def find_best_fit(player_series):
-        player_pos = {(p or "").strip().upper() for p in (player_series.get("positions") or [])}
-        for tier in sorted_tiers:
-            best_role_for_tier = None
-            max_score_for_tier = -1
+    return roster_response(request, f"owned-{OWNED_ROSTER.version}-{SQUAD_STORE.version}", build, format)
 
-            for role_data in ROLES_DATA:
-                role_name = (role_data.get("Role") or role_data.get("RoleType") or "").strip().upper()
-                if not role_name: continue
+@app.get("/players/top-by-role")
+async def get_top_players_by_role(tier: str = "Iron", k: int = 5, assignment: str = "all", roles: Optional[List[str]] = Query(None)):
+    if tier not in TIER_THRESH:
+        raise HTTPException(status_code=400, detail=f"Unknown tier '{tier}'")
+    if assignment not in ("all", "assigned", "unassigned"):
+        raise HTTPException(status_code=400, detail="assignment must be 'all', 'assigned' or 'unassigned'")
+    role_names = [r for r in (roles or ROLE_LOOKUP.keys()) if r]
+    check_roles(role_names)
+    await OWNED_ROSTER.get()  # builds or refreshes the index on a cold cache
+    k = max(1, min(k, 100))
+    return {
+        "tier": tier,
+        "roles": {(r or "").strip().upper(): ROLE_RANK_INDEX.top(r, tier, k, assignment, SQUAD_STORE.club_of) for r in role_names}
+    }
 
-                role_info = ROLE_LOOKUP.get(role_name)
-                if not role_info:
-                    continue
-                
-                required_pos = (role_info.get("Position", "") or "").strip().upper()
-                if required_pos and required_pos not in player_pos:
-                    continue
-                
-                score, label, _ = calc_fit(player_series, role_name, tier)
-                
-                if score > max_score_for_tier:
-                    max_score_for_tier = score
-                    best_role_for_tier = role_name
-            
-            if max_score_for_tier >= 0:
-                return pd.Series([tier, best_role_for_tier], index=['bestTier', 'bestRole'])
-
-        return pd.Series(["Unrated", "N/A"], index=['bestTier', 'bestRole'])
-
-    best_fit_df = players_df.apply(find_best_fit, axis=1)
-    players_df = pd.concat([players_df, best_fit_df], axis=1)
-
-    squads = load_squads()
-    player_to_club_map = {}
-    for club_name, club_data in squads.items():
-        roster_ids = club_data.get("roster", []) if isinstance(club_data, dict) else club_data
-        for player_id in roster_ids:
-            player_to_club_map[int(player_id)] = club_name
-    players_df['assigned_club'] = players_df['id'].map(player_to_club_map).fillna("Unassigned")
-    return json.loads(players_df.to_json(orient="records"))
+@app.get("/player/{player_id}/club")
+async def get_player_club(player_id: int):
+    return {"player_id": player_id, "club_name": SQUAD_STORE.club_of(player_id) or "Unassigned"}
+
+@app.get("/players/unassigned")
+async def get_unassigned_players(request: Request, format: Optional[str] = None):
+    players_df = await OWNED_ROSTER.get()
+    if players_df.empty:
+        return []
+    build = lambda: players_df[~players_df['id'].isin(SQUAD_STORE.player_club_map().keys())]
+    return roster_response(request, f"unassigned-{OWNED_ROSTER.version}-{SQUAD_STORE.version}", build, format)
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    return {"owned_roster": OWNED_ROSTER.stats(), "players": PLAYER_CACHE.stats(), "listings": LISTING_CACHE.stats(), "role_index": ROLE_RANK_INDEX.stats(), "events": EVENT_POLLER.stats(), "club_summaries": CLUB_SUMMARIES.stats()}
+
+@app.post("/cache/owned/invalidate")
+async def invalidate_owned_roster(refresh: bool = False):
+    await OWNED_ROSTER.invalidate(refresh=refresh)
+    return {"message": "Owned roster cache invalidated.", "stats": OWNED_ROSTER.stats()}
+
+@app.get("/metrics")
+async def get_metrics():
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/debug/profiler")
+async def get_profiler(format: str = "json"):
+    if format == "collapsed":
+        return PlainTextResponse(PROFILER.collapsed())
+    return PROFILER.stats()
+
+@app.post("/debug/profiler/start")
+async def start_profiler(interval_ms: float = 5, seconds: float = 30):
+    if not PROFILER_ENABLED:
+        raise HTTPException(status_code=403, detail="Profiler is disabled; set PROFILER_ENABLED=1")
+    if not PROFILER.start(max(0.001, interval_ms / 1000), max(0.1, min(seconds, PROFILER_MAX_SECONDS))):
+        raise HTTPException(status_code=409, detail="Profiler is already running")
+    return PROFILER.stats()
+
+@app.post("/debug/profiler/stop")
+async def stop_profiler():
+    PROFILER.stop()
+    return PROFILER.stats()
+
+class SnapshotRequest(BaseModel):
+    kinds: List[str] = list(SNAPSHOT_KINDS)
+    auth_token: Optional[str] = None   # for the listings API
+    max_pages: Optional[int] = None    # listing pages, capped at SNAPSHOT_MARKET_MAX_PAGES
+
+def require_snapshots():
+    if pa is None:
+        raise HTTPException(status_code=501, detail="Snapshots need pyarrow on this server")
+
+@app.get("/snapshots")
+async def get_snapshots(kind: Optional[str] = None):
+    require_snapshots()
+    return {"serving": SNAPSHOT_SERVE, "snapshots": SNAPSHOTS.list_snapshots(kind)}
+
+@app.post("/snapshots")
+async def create_snapshots(req: SnapshotRequest):
+    require_snapshots()
+    unknown = [k for k in req.kinds if k not in SNAPSHOT_KINDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown snapshot kinds: {', '.join(unknown)}")
+    # Each kind is written on its own: one failing upstream must not hide the snapshots that did land.
+    results = []
+    for kind in dict.fromkeys(req.kinds):
+        try:
+            results.append({**await take_snapshot(kind, req.auth_token, req.max_pages), "ok": True})
+        except HTTPException as e:
+            results.append({"kind": kind, "ok": False, "error": e.detail})
+        except (UpstreamUnavailable, httpx.HTTPError, ValueError) as e:
+            results.append({"kind": kind, "ok": False, "error": str(e) or type(e).__name__})
+    return {"snapshots": results}
+
+@app.get("/snapshots/diff")
+async def diff_snapshots(kind: str = "roster", old: str = Query(..., alias="from"), new: str = Query("latest", alias="to"), fields: Optional[List[str]] = Query(None)):
+    require_snapshots()
+    if kind not in SNAPSHOT_KINDS:
+        raise HTTPException(status_code=400, detail=f"kind must be one of: {', '.join(SNAPSHOT_KINDS)}")
+    try:
+        result = SNAPSHOTS.diff(kind, SNAPSHOTS.resolve(kind, old), SNAPSHOTS.resolve(kind, new), fields)
+    except SnapshotUnavailable as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return Response(content=orjson.dumps(result, option=orjson.OPT_SERIALIZE_NUMPY), media_type="application/json")
+
+@app.get("/upstream/status")
+async def get_upstream_status():
+    return UPSTREAM.stats()
+
+@app.get("/events/status")
+async def get_events_status():
+    return EVENT_POLLER.stats()
+
+@app.post("/events/poll")
+async def poll_events():
+    try:
+        return await EVENT_POLLER.poll_once()
+    except (httpx.HTTPError, ValueError) as e:
+        raise HTTPException(status_code=502, detail=f"Failed to read events feed: {e}")
 
 @app.get("/clubs")
-def get_clubs() -> List[Club]:
-    squads_data = load_squads()
-    club_list = []
-    for club_name, club_data in squads_data.items():
-        if isinstance(club_data, dict) and "club_name" in club_data:
-            club_list.append(club_data)
-        elif isinstance(club_data, list):
-            club_list.append({
-                "club_name": club_name,
-                "tier": "Iron",
-                "roster": club_data
-            })
-    return club_list
+async def get_clubs(summaries: bool = True) -> List[ClubView]:
+    clubs = SQUAD_STORE.list_clubs()
+    if summaries:
+        CLUB_SUMMARIES.update()
+        for club in clubs:
+            club["summary"] = CLUB_SUMMARIES.get(club["club_name"])
+    return clubs
 
 @app.post("/clubs")
-def create_club(club: Club):
-    squads_data = load_squads()
-    if club.club_name in squads_data:
+async def create_club(club: Club):
+    try:
+        created = SQUAD_STORE.create_club(club.club_name, club.tier, club.roster)
+    except RosterConflict as e:
+        raise HTTPException(status_code=409, detail={"message": "Players already belong to another club", "conflicts": e.conflicts})
+    if not created:
         raise HTTPException(status_code=400, detail="Club with this name already exists")
-    squads_data[club.club_name] = club.dict()
-    save_squads(squads_data)
     return club
 
+class ClubOperation(BaseModel):
+    op: str                             # 'assign', 'remove', 'set_roster', 'create_club' or 'delete_club'
+    player_id: Optional[int] = None
+    club_name: Optional[str] = None
+    roster: Optional[List[int]] = None
+    tier: Optional[str] = None
+
+class ClubBulkRequest(BaseModel):
+    operations: List[ClubOperation]
+    atomic: bool = True                 # False: skip invalid operations and apply the rest
+
+@app.post("/clubs/bulk")
+async def bulk_club_operations(req: ClubBulkRequest):
+    if len(req.operations) > CLUB_BULK_MAX_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {CLUB_BULK_MAX_OPERATIONS} operations per request.")
+    applied, results = SQUAD_STORE.apply_operations([op.model_dump() for op in req.operations], atomic=req.atomic)
+    if not applied:
+        raise HTTPException(status_code=409, detail={"message": "No operations applied; some are invalid", "results": results})
+    return {"applied": sum(1 for r in results if r["ok"]), "failed": sum(1 for r in results if not r["ok"]), "results": results}
+
 class PlayerIds(BaseModel):
     player_ids: List[int]
 
 @app.post("/players/by_ids")
-def get_players_by_ids(player_ids_model: PlayerIds):
+async def get_players_by_ids(player_ids_model: PlayerIds, request: Request, format: Optional[str] = None):
     player_ids = player_ids_model.player_ids
-    players_df = fetch_players()
+    players_df = await OWNED_ROSTER.get()
     if players_df.empty:
         return []
-    
-    roster_players = players_df[players_df['id'].isin(player_ids)].copy()
-    
-    # Calculate best role for each player in the roster
-    best_fit_df = roster_players.apply(calculate_best_role_for_player, axis=1)
-    roster_players = pd.concat([roster_players, best_fit_df], axis=1)
 
-    return json.loads(roster_players.to_json(orient="records"))
+    # Best-fit columns are computed once when the roster is cached
+    ids_key = hashlib.blake2b(orjson.dumps(sorted(set(player_ids))), digest_size=8).hexdigest()
+    return roster_response(request, f"ids-{OWNED_ROSTER.version}-{ids_key}", lambda: players_df[players_df['id'].isin(player_ids)], format)
 
 class PlayerSearchRequest(BaseModel):
     role_name: str
@@ -367,13 +2192,16 @@ class PlayerSearchRequest(BaseModel):
     sort_by: Optional[str] = None     # e.g. 'listing.price'
     sort_order: Optional[str] = None  # 'ASC' or 'DESC'
 
-@app.post("/market/search")
-def search_market(req: PlayerSearchRequest):
-    headers = {"Authorization": f"Bearer {req.auth_token}"}
+class DeepSearchRequest(PlayerSearchRequest):
+    top_n: Optional[int] = None       # stop once this many matches have been streamed
+    max_pages: Optional[int] = None   # capped at MARKET_DEEP_MAX_PAGES
+    page_size: Optional[int] = None
+    format: Optional[str] = None      # 'ndjson' or 'sse'; defaults from the Accept header
 
+def build_market_params(req: PlayerSearchRequest, limit: int = 50) -> Dict[str, Any]:
     # Build external API query
     external_api_params = {
-        "limit": 50,
+        "limit": limit,
         "type": "PLAYER",
         "status": "AVAILABLE",
         "view": "full",
@@ -400,136 +2228,763 @@ def search_market(req: PlayerSearchRequest):
         external_api_params["physicalMin"] = req.physicalMin
     if req.goalkeepingMin is not None:
         external_api_params["goalkeepingMin"] = req.goalkeepingMin
+    return external_api_params
 
+async def fetch_market_page(auth_token: str, params: Dict[str, Any]) -> List[Dict]:
+    if SNAPSHOT_SERVE:
+        return SNAPSHOTS.market_page(params)
+    headers = {"Authorization": f"Bearer {auth_token}"} if auth_token else None
     try:
-        r = requests.get(MARKETPLACE_API, headers=headers, params=external_api_params, timeout=30)
+        r = await UPSTREAM.get(MARKETPLACE_API, headers=headers, params=params)
         r.raise_for_status()
-        listings = r.json()
-    except requests.exceptions.RequestException as e:
+        return r.json() or []
+    except UpstreamUnavailable:
+        raise
+    except (httpx.HTTPError, ValueError) as e:
         raise HTTPException(status_code=400, detail=f"Failed to fetch marketplace listings: {e}")
 
-    results = []
+# (listing, normalize_player dict) for every listing that carries a player.
+def listing_candidates(listings: List[Dict]) -> List[tuple]:
+    candidates = []
     for listing in listings or []:
         player = (listing or {}).get("player") or {}
         meta = player.get("metadata") or {}
         player_id = player.get("id")
         if player_id is None or not meta:
             continue
+        candidates.append((listing, normalize_player(player)))
+    return candidates
 
-        # Normalise to the fields calc_fit expects
-        positions_raw = meta.get("positions", [])
-        positions_norm = [(p or "").strip().upper() for p in positions_raw]
-        player_dict = {
-            "id": player_id,
-            "firstName": meta.get("firstName", ""),
-            "lastName": meta.get("lastName", ""),
-            "age": meta.get("age", 0),
-            "positions": positions_norm,
-            "overall": meta.get("overall", 0),
-            "pace": meta.get("pace", 0),
-            "shooting": meta.get("shooting", 0),
-            "passing": meta.get("passing", 0),
-            "dribbling": meta.get("dribbling", 0),
-            "defense": meta.get("defense", 0),
-            "physical": meta.get("physical", 0),
-            "goalkeeping": meta.get("goalkeeping", 0),
-        }
-        player_series = pd.Series(player_dict)
-
-        # Fit for requested role/tier using TIER_THRESH + role Attribute1..4
-        score, label, _ = calc_fit(player_series, req.role_name, req.tier)
-
-        if score >= 0:
-            player_data = {**player_dict, "fit_score": int(score), "fit_label": label}
-            results.append({
-                "listingResourceId": listing.get("listingResourceId"),
-                "status": listing.get("status"),
-                "price": listing.get("price"),
-                "player": {
-                    "id": player_id,
-                    "metadata": player_data
-                },
-                "sellerAddress": listing.get("sellerAddress"),
-                "sellerName": listing.get("sellerName"),
-                "createdDateTime": listing.get("createdDateTime"),
-            })
+def market_result(listing: Dict, player_dict: Dict, score: int, label: str) -> Dict[str, Any]:
+    player_data = {**player_dict, "fit_score": int(score), "fit_label": label}
+    return {
+        "listingResourceId": listing.get("listingResourceId"),
+        "status": listing.get("status"),
+        "price": listing.get("price"),
+        "player": {
+            "id": player_dict["id"],
+            "metadata": player_data
+        },
+        "sellerAddress": listing.get("sellerAddress"),
+        "sellerName": listing.get("sellerName"),
+        "createdDateTime": listing.get("createdDateTime"),
+    }
 
-    return results
+def score_market_listings(listings: List[Dict], role_name: str, tier: str) -> List[Dict]:
+    candidates = listing_candidates(listings)
+    if not candidates:
+        return []
 
+    # Fit for requested role/tier using TIER_THRESH + role Attribute1..4, all listings at once
+    scores, labels, _ = SCORING_ENGINE.fit([p for _, p in candidates], role_name, tier)
 
-@app.post("/players/assign")
-def assign_player_club(req: PlayerAssignmentRequest):
-    squads = load_squads()
-
-    def get_roster(club_name):
-        if club_name not in squads: return None
-        club_data = squads[club_name]
-        if isinstance(club_data, dict): return club_data.get("roster", [])
-        elif isinstance(club_data, list): return club_data
-        return None
+    return [market_result(listing, player_dict, score, label) for (listing, player_dict), score, label in zip(candidates, scores.tolist(), labels) if score >= 0]
+
+@app.post("/market/search")
+async def search_market(req: PlayerSearchRequest):
+    listings = await fetch_market_page(req.auth_token, build_market_params(req))
+    return score_market_listings(listings, req.role_name, req.tier)
+
+# --- Deep Market Search ---
+# Streams matches in page order (so sort order is preserved) while later pages are prefetched, and
+# stops at the page cap, at the end of the listings, or as soon as top_n matches have been sent.
+#
+# market_pages is the one pager for every multi-page listings read (deep search, market scan,
+# snapshots): pages of one query, up to MARKET_DEEP_CONCURRENCY fetched ahead, yielded in order with
+# listings already seen on an earlier page dropped. It stops on a short page, a page with nothing new
+# (paging ignored upstream) or max_pages. A failing first page raises; a later failure ends the pages
+# and is recorded in scan["stopped"] / scan["error"].
+async def market_pages(auth_token: str, base_params: Dict[str, Any], page_size: int, max_pages: int, scan: Dict[str, Any], first_page: Optional[List[Dict]] = None):
+    scan.update(pages=0, upstream_calls=0, scanned=0, stopped="max_pages")
+    seen = set()
+    next_page = 1
+    pending: Dict[int, asyncio.Task] = {}
+
+    def schedule():
+        nonlocal next_page
+        while next_page < max_pages and len(pending) < MARKET_DEEP_CONCURRENCY:
+            params = {**base_params, MARKET_PAGE_OFFSET_PARAM: next_page * page_size}
+            pending[next_page] = asyncio.create_task(fetch_market_page(auth_token, params))
+            scan["upstream_calls"] += 1
+            next_page += 1
+
+    if first_page is None:
+        scan["upstream_calls"] += 1
+        first_page = await fetch_market_page(auth_token, base_params)
+    try:
+        page_index, listings = 0, first_page
+        schedule()
+        while True:
+            scan["pages"] += 1
+            new_listings = []
+            for listing in listings:
+                key = (listing or {}).get("listingResourceId")
+                if key is not None and key in seen: continue
+                seen.add(key)
+                new_listings.append(listing)
+            scan["scanned"] += len(new_listings)
+            yield new_listings
+            if len(listings) < page_size or not new_listings:
+                scan["stopped"] = "exhausted"
+                break
+            page_index += 1
+            if page_index not in pending: break
+            try:
+                listings = await pending.pop(page_index)
+            except (HTTPException, UpstreamUnavailable) as e:
+                scan.update(stopped="upstream_error", error={"page": page_index, "detail": getattr(e, "detail", str(e))})
+                break
+            schedule()
+    finally:
+        for task in pending.values():
+            if not task.cancel() and not task.cancelled():
+                task.exception()  # a prefetch that already failed; nobody will await it
+
+def encode_stream_event(event: str, data: Any, fmt: str) -> str:
+    if fmt == "sse":
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return json.dumps({"event": event, "data": data}) + "\n"
+
+async def deep_market_search(req: DeepSearchRequest, first_page: List[Dict], base_params: Dict[str, Any], page_size: int, max_pages: int, fmt: str):
+    scan: Dict[str, Any] = {}
+    matched = 0
+    async with aclosing(market_pages(req.auth_token, base_params, page_size, max_pages, scan, first_page)) as pages:
+        async for listings in pages:
+            for result in score_market_listings(listings, req.role_name, req.tier):
+                matched += 1
+                yield encode_stream_event("result", result, fmt)
+                if req.top_n and matched >= req.top_n:
+                    scan["stopped"] = "top_n"
+                    break
+            if scan["stopped"] == "top_n": break
+    if "error" in scan:
+        yield encode_stream_event("error", scan["error"], fmt)
+    yield encode_stream_event("done", {"pages": scan["pages"], "scanned": scan["scanned"], "matched": matched, "stopped": scan["stopped"]}, fmt)
+
+@app.post("/market/search/deep")
+async def deep_search_market(req: DeepSearchRequest, request: Request):
+    fmt = (req.format or ("sse" if "text/event-stream" in request.headers.get("accept", "") else "ndjson")).lower()
+    if fmt not in ("ndjson", "sse"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'sse'")
+    page_size = max(1, min(req.page_size or MARKET_PAGE_SIZE, MARKET_PAGE_SIZE))
+    max_pages = max(1, min(req.max_pages or MARKET_DEEP_MAX_PAGES, MARKET_DEEP_MAX_PAGES))
+
+    # Only listings in the role's position can score; narrow the scan when no positions were given
+    base_params = build_market_params(req, limit=page_size)
+    role = ROLE_LOOKUP.get((req.role_name or "").strip().upper())
+    if not req.positions and role and (role.get("Position") or "").strip():
+        base_params["positions"] = role["Position"].strip().upper()
+
+    # The first page is fetched up front so an upstream failure still surfaces as a 400
+    first_page = await fetch_market_page(req.auth_token, base_params)
+    media_type = "text/event-stream" if fmt == "sse" else "application/x-ndjson"
+    return StreamingResponse(deep_market_search(req, first_page, base_params, page_size, max_pages, fmt), media_type=media_type)
+
+# --- Market Scan ---
+# One scan for many (role, tier, filters) targets, e.g. replacements for a whole XI. The upstream
+# query is the loosest one that still covers every target (union of positions; an attribute
+# minimum only when every target sets one, at the lowest value), its pages are fetched once with a
+# window of concurrent requests, and each target's own filters are applied locally. All listings are
+# scored against all targets in one matrix pass. A listing that ranks for several targets is
+# reported under each of them and flagged in `also_matches`.
+MARKET_FILTER_ATTRS = ["pace", "shooting", "passing", "dribbling", "defense", "physical", "goalkeeping"]
+
+class MarketScanTarget(BaseModel):
+    role_name: str
+    tier: str
+    positions: Optional[List[str]] = None
+    paceMin: Optional[int] = None
+    shootingMin: Optional[int] = None
+    passingMin: Optional[int] = None
+    dribblingMin: Optional[int] = None
+    defenseMin: Optional[int] = None
+    physicalMin: Optional[int] = None
+    goalkeepingMin: Optional[int] = None
+    limit: int = 10                   # candidates returned for this target
+
+class MarketScanRequest(BaseModel):
+    auth_token: str
+    targets: List[MarketScanTarget]
+    sort_by: Optional[str] = None
+    sort_order: Optional[str] = None
+    max_pages: Optional[int] = None   # capped at MARKET_SCAN_MAX_PAGES
+    page_size: Optional[int] = None
+
+def target_positions(target: MarketScanTarget) -> Optional[set]:
+    if target.positions:
+        return {(p or "").strip().upper() for p in target.positions if p}
+    role_position = (ROLE_LOOKUP[(target.role_name or "").strip().upper()].get("Position") or "").strip().upper()
+    return {role_position} if role_position else None
+
+def build_scan_params(req: MarketScanRequest, page_size: int) -> Dict[str, Any]:
+    params = {"limit": page_size, "type": "PLAYER", "status": "AVAILABLE", "view": "full"}
+    if req.sort_by:
+        params["sorts"] = req.sort_by
+    if req.sort_order:
+        params["sortsOrders"] = (req.sort_order or "").upper()
+    position_sets = [target_positions(t) for t in req.targets]
+    if all(position_sets):
+        params["positions"] = ",".join(sorted(set().union(*position_sets)))
+    for attr in MARKET_FILTER_ATTRS:
+        minimums = [getattr(t, f"{attr}Min") for t in req.targets]
+        if all(m is not None for m in minimums):
+            params[f"{attr}Min"] = min(minimums)
+    return params
+
+# Every listing market_pages reads, with its scan summary.
+async def fetch_market_listings(auth_token: str, base_params: Dict[str, Any], page_size: int, max_pages: int, on_page=None):
+    listings: List[Dict] = []
+    scan: Dict[str, Any] = {}
+    async for page in market_pages(auth_token, base_params, page_size, max_pages, scan):
+        listings += page
+        if on_page is not None:
+            on_page(scan["pages"], max_pages)
+    scan.pop("error", None)
+    return listings, scan
+
+@app.post("/market/scan")
+async def scan_market(req: MarketScanRequest):
+    return await run_market_scan(req, *check_scan_request(req))
+
+# (page_size, max_pages) for a valid request
+def check_scan_request(req: MarketScanRequest):
+    if not req.targets:
+        raise HTTPException(status_code=400, detail="At least one target is required.")
+    if len(req.targets) > MARKET_SCAN_MAX_TARGETS:
+        raise HTTPException(status_code=400, detail=f"At most {MARKET_SCAN_MAX_TARGETS} targets per scan.")
+    check_roles([t.role_name for t in req.targets])
+    unknown_tiers = [t.tier for t in req.targets if t.tier not in TIER_THRESH]
+    if unknown_tiers:
+        raise HTTPException(status_code=400, detail=f"Unknown tiers: {', '.join(unknown_tiers)}")
+    page_size = max(1, min(req.page_size or MARKET_PAGE_SIZE, MARKET_PAGE_SIZE))
+    max_pages = max(1, min(req.max_pages or MARKET_SCAN_MAX_PAGES, MARKET_SCAN_MAX_PAGES))
+    return page_size, max_pages
+
+# `on_page(pages_read, max_pages)` is called as pages arrive.
+async def run_market_scan(req: MarketScanRequest, page_size: int, max_pages: int, on_page=None) -> Dict[str, Any]:
+    listings, scan = await fetch_market_listings(req.auth_token, build_scan_params(req, page_size), page_size, max_pages, on_page)
+    candidates = listing_candidates(listings)
+    results = [{"role_name": t.role_name, "tier": t.tier, "matched": 0, "candidates": []} for t in req.targets]
+    if candidates:
+        players_df = pd.DataFrame([player_dict for _, player_dict in candidates])
+        scores, raw = SCORING_ENGINE.fit_many(players_df, [t.role_name for t in req.targets], [t.tier for t in req.targets])
+        prices = np.array([pd.to_numeric(listing.get("price"), errors="coerce") for listing, _ in candidates], dtype=float)
+        prices = np.where(np.isnan(prices), np.inf, prices)
+        player_positions = players_df["positions"].tolist()
+        for k, target in enumerate(req.targets):
+            keep = scores[:, k] >= 0
+            if target.positions:
+                wanted = target_positions(target)
+                keep &= np.array([not wanted.isdisjoint(ps) for ps in player_positions], dtype=bool)
+            for attr in MARKET_FILTER_ATTRS:
+                minimum = getattr(target, f"{attr}Min")
+                if minimum is not None:
+                    keep &= pd.to_numeric(players_df[attr], errors="coerce").fillna(0).to_numpy() >= minimum
+            rows = np.flatnonzero(keep)
+            rows = rows[np.lexsort((prices[rows], -scores[rows, k]))]  # best fit first, then cheapest
+            results[k]["matched"] = len(rows)
+            results[k]["candidates"] = [
+                market_result(candidates[row][0], candidates[row][1], scores[row, k], fit_label(raw[row, k]))
+                for row in rows[:max(1, min(target.limit, 100))]
+            ]
+
+    # Flag listings returned for more than one target
+    targets_by_listing: Dict[Any, List[int]] = {}
+    for k, result in enumerate(results):
+        for candidate in result["candidates"]:
+            targets_by_listing.setdefault(candidate["listingResourceId"], []).append(k)
+    for k, result in enumerate(results):
+        for candidate in result["candidates"]:
+            candidate["also_matches"] = [other for other in targets_by_listing[candidate["listingResourceId"]] if other != k]
+    duplicates = {str(listing_id): ks for listing_id, ks in targets_by_listing.items() if len(ks) > 1}
+    return {"targets": results, "duplicates": duplicates, "scan": scan}
 
-    def update_roster(club_name, new_roster):
-        if club_name not in squads: return
-        club_data = squads[club_name]
-        if isinstance(club_data, dict): club_data["roster"] = new_roster
-        elif isinstance(club_data, list): squads[club_name] = new_roster
-
-    if req.old_club_name != "Unassigned":
-        old_roster = get_roster(req.old_club_name)
-        if old_roster is not None and req.player_id in old_roster:
-            old_roster.remove(req.player_id)
-            update_roster(req.old_club_name, old_roster)
-
-    if req.new_club_name != "Unassigned":
-        new_roster = get_roster(req.new_club_name)
-        if new_roster is not None and req.player_id not in new_roster:
-            new_roster.append(req.player_id)
-            update_roster(req.new_club_name, new_roster)
-
-    save_squads(squads)
+@app.post("/players/assign")
+async def assign_player_club(req: PlayerAssignmentRequest):
+    SQUAD_STORE.move_player(req.player_id, req.new_club_name)
     return {"message": f"Player {req.player_id} assignment updated."}
 
+# --- Squad Assignment ---
+# Solvers (greedy_assignment, optimal_assignment) are in scoring.py.
+SOLVERS = ("greedy", "optimal")
+
 @app.post("/squads/simulate")
-def simulate_squad(req: SimulationRequest):
-    players_df = fetch_players()
+async def simulate_squad(req: SimulationRequest):
+    if req.solver not in SOLVERS:
+        raise HTTPException(status_code=400, detail=f"Unknown solver '{req.solver}'. Use one of: {', '.join(SOLVERS)}.")
+    players_df = await OWNED_ROSTER.get()
     if players_df.empty:
         raise HTTPException(status_code=400, detail="No players available for simulation.")
 
-    roster_players = players_df[players_df['id'].isin(req.player_ids)].copy()
+    roster_players = players_df[players_df['id'].isin(req.player_ids)]
     if roster_players.empty:
         raise HTTPException(status_code=400, detail="None of the selected players could be found.")
 
-    squad = []
-    for slot, role_name in req.role_map.items():
-        best_player_for_slot = None
-        highest_score = -1
-
-        # Find the best player for the current slot
-        for _, player in roster_players.iterrows():
-            score, label, _ = calc_fit(player, role_name, req.tier)
-            if score > highest_score:
-                highest_score = score
-                best_player_for_slot = player
-
-        # Add the best player to the squad and remove them from the available roster
-        if best_player_for_slot is not None:
-            squad.append({
-                "slot": slot,
-                "assigned_role": role_name,
-                "player_id": best_player_for_slot['id'],
-                "player_name": f"{best_player_for_slot['firstName']} {best_player_for_slot['lastName']}",
-                "fit_score": highest_score,
-                "fit_label": "Elite" if highest_score >= 50 else "Strong" if highest_score >= 20 else "Natural" if highest_score >= 0 else "Weak" if highest_score >= -20 else "Unusable"
-            })
-            roster_players = roster_players[roster_players['id'] != best_player_for_slot['id']]
+    # Player x slot fit matrix, built once for both solvers
+    slots = list(req.role_map.items())
+    scores = SCORING_ENGINE.role_scores(roster_players, [role_name for _, role_name in slots], req.tier)
+    greedy = greedy_assignment(scores)
+    chosen = optimal_assignment(scores) if req.solver == "optimal" else greedy
+
+    squad = [squad_slot(slot, role_name, roster_players.iloc[row], int(scores[row, k])) if row >= 0 else squad_slot(slot, role_name)
+             for k, ((slot, role_name), row) in enumerate(zip(slots, chosen))]
+
+    return {
+        "squad": squad,
+        "solver": req.solver,
+        "total_score": assignment_total(scores, chosen),
+        "greedy_total_score": assignment_total(scores, greedy)
+    }
+
+# --- Formation Recommender ---
+# A slot's total only depends on the player in it and the role they play there, so the best role
+# choice for a slot is simply the player's best-fitting role among those of the slot's position.
+# Every player is therefore scored once against every candidate role, reduced to one column per
+# position (best fit + which role), and each formation becomes a single players x slots assignment
+# over those columns - the same result as searching every role combination, without the blow-up.
+def position_fits(players_df: pd.DataFrame, tier: str, roles: Optional[List[str]] = None) -> Dict[str, tuple]:
+    wanted = {(r or "").strip().upper() for r in roles} if roles is not None else None
+    role_names = [name for name in dict.fromkeys(SCORING_ENGINE.role_names) if name in ROLE_LOOKUP and (wanted is None or name in wanted)]
+    by_position: Dict[str, List[int]] = {}
+    for j, name in enumerate(role_names):
+        by_position.setdefault((ROLE_LOOKUP[name].get("Position") or "").strip().upper(), []).append(j)
+    scores = SCORING_ENGINE.role_scores(players_df, role_names, tier) if role_names else np.zeros((len(players_df), 0), dtype=int)
+    fits = {}
+    for position, cols in by_position.items():
+        position_scores = scores[:, cols]
+        best = position_scores.argmax(axis=1)  # first role wins ties, in roles.json order
+        fits[position] = (position_scores[np.arange(len(best)), best], np.array([role_names[j] for j in cols], dtype=object)[best])
+    return fits
+
+@app.post("/formations/recommend")
+async def recommend_formations(req: FormationRecommendRequest):
+    names = check_formation_request(req)
+    roster_players = await formation_players(req)
+    fits = position_fits(roster_players, req.tier, req.roles)
+    players = roster_players[['id', 'firstName', 'lastName']].to_dict("records")
+    ranked = [recommend_formation(name, FORMATION_MAPS[name], fits, players, req.solver, req.include_squads) for name in names]
+    return formation_response(req, len(roster_players), ranked)
+
+# Formation names to evaluate for a valid request
+def check_formation_request(req: FormationRecommendRequest) -> List[str]:
+    if req.solver not in SOLVERS:
+        raise HTTPException(status_code=400, detail=f"Unknown solver '{req.solver}'. Use one of: {', '.join(SOLVERS)}.")
+    if req.tier not in TIER_THRESH:
+        raise HTTPException(status_code=400, detail=f"Unknown tier '{req.tier}'")
+    names = list(FORMATION_MAPS) if req.formations is None else req.formations
+    unknown_formations = [name for name in names if name not in FORMATION_MAPS]
+    if unknown_formations:
+        raise HTTPException(status_code=400, detail=f"Unknown formations: {', '.join(unknown_formations)}")
+    check_roles(req.roles)
+    return names
+
+async def formation_players(req: FormationRecommendRequest) -> pd.DataFrame:
+    player_ids = req.player_ids
+    if player_ids is None and req.club_name is not None:
+        club = SQUAD_STORE.get_club(req.club_name)
+        if club is None:
+            raise HTTPException(status_code=404, detail="Club not found")
+        player_ids = club["roster"]
+    players_df = await OWNED_ROSTER.get()
+    if players_df.empty:
+        raise HTTPException(status_code=400, detail="No players available for recommendation.")
+    roster_players = players_df if player_ids is None else players_df[players_df['id'].isin(player_ids)]
+    if roster_players.empty:
+        raise HTTPException(status_code=400, detail="None of the selected players could be found.")
+    return roster_players
+
+# `ranked` must be in the order of check_formation_request's names
+def formation_response(req: FormationRecommendRequest, player_count: int, ranked: List[Dict[str, Any]]) -> Dict[str, Any]:
+    ranked = sorted(ranked, key=lambda r: (-r["total_score"], -r["filled_slots"]))  # stable: formations.json order breaks ties
+    return {
+        "tier": req.tier,
+        "solver": req.solver,
+        "players": player_count,
+        "formations": ranked[:req.limit] if req.limit else ranked
+    }
+
+# --- Club Summaries ---
+# Per-club strength aggregates, stored next to the clubs and served by /clubs. Clubs are marked
+# dirty when their roster or tier changes (store listener) or when one of their players is
+# re-scored (roster listener; a full reload marks every club). On read only dirty clubs are
+# fingerprinted - tier plus the scoring inputs of every member - and a summary is recomputed only
+# when its fingerprint differs from the stored one.
+CLUB_SUMMARY_VERSION = 1  # bump when the summary shape or its inputs change
+
+def club_summary(members: pd.DataFrame, roster_size: int, tier: str) -> Dict[str, Any]:
+    summary = {"players": roster_size, "found": len(members), "average_overall": None, "tier_distribution": {}, "position_coverage": {}, "best_xi": None}
+    if members.empty:
+        return summary
+    summary["average_overall"] = round(float(pd.to_numeric(members["overall"], errors="coerce").fillna(0).mean()), 1)
+    counts = members["bestTier"].value_counts()
+    summary["tier_distribution"] = {t: int(counts[t]) for t in SCORING_ENGINE.tiers + ["Unrated"] if t in counts}
+    fits = position_fits(members, tier)
+    for position, (scores, roles) in sorted(fits.items()):
+        covered = scores >= 0
+        best = int(scores.argmax())
+        summary["position_coverage"][position] = {
+            "players": int(covered.sum()),
+            "best_score": int(scores[best]) if covered.any() else None,
+            "best_role": roles[best] if covered.any() else None,
+        }
+    players = members[["id", "firstName", "lastName"]].to_dict("records")
+    ranked = [recommend_formation(name, formation, fits, players, "optimal", False) for name, formation in FORMATION_MAPS.items()]
+    summary["best_xi"] = max(ranked, key=lambda r: (r["total_score"], r["filled_slots"]), default=None)
+    return summary
+
+class ClubSummaries:
+    FIELDS = ["overall"] + SCORING_ENGINE.attr_columns
+
+    def __init__(self, store: SquadStore, roster: OwnedRosterCache):
+        self.store = store
+        self.roster = roster
+        self._summaries = store.load_summaries()
+        self._dirty = {club["club_name"] for club in store.list_clubs()}
+        self.recomputed = self.reused = 0
+
+    def on_clubs_changed(self, touched: List[str]):
+        self._dirty.update(touched)
+
+    def on_roster_changed(self, players_df: pd.DataFrame, delta=None):
+        if delta is None:
+            self._dirty.update(club["club_name"] for club in self.store.list_clubs())
+            return
+        players, removed = delta
+        changed = [int(p["id"]) for p in players] + [int(pid) for pid in removed]
+        self._dirty.update(name for name in map(self.store.club_of, changed) if name is not None)
+
+    def _fingerprint(self, tier: str, members: pd.DataFrame) -> str:
+        rows = members.reindex(columns=["id", "positions"] + self.FIELDS).to_dict("records")
+        inputs = sorted((int(p["id"]), list(p["positions"]) if isinstance(p["positions"], (list, tuple, np.ndarray)) else [], [p[c] for c in self.FIELDS]) for p in rows)
+        payload = orjson.dumps([CLUB_SUMMARY_VERSION, tier, len(members), inputs], default=str, option=orjson.OPT_SERIALIZE_NUMPY)
+        return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+    # Bring dirty clubs up to date from the cached roster only. While none is cached (a background
+    # load is started) or it is empty, clubs stay dirty and the stored summaries keep being served.
+    def update(self):
+        if not self._dirty:
+            return
+        players_df = self.roster.peek()
+        if players_df is None:
+            self.roster.warm()
+            return
+        if players_df.empty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        updated = {}
+        for name in dirty:
+            club = self.store.get_club(name)
+            if club is None:
+                self._summaries.pop(name, None)
+                continue
+            members = players_df[players_df['id'].isin(club["roster"])]
+            fingerprint = self._fingerprint(club["tier"], members)
+            stored = self._summaries.get(name)
+            if stored is not None and stored[0] == fingerprint:
+                self.reused += 1
+                continue
+            summary = {**club_summary(members, len(club["roster"]), club["tier"]), "tier": club["tier"], "computed_at": datetime.now(timezone.utc).isoformat()}
+            updated[name] = self._summaries[name] = (fingerprint, summary)
+            self.recomputed += 1
+        if updated:
+            self.store.save_summaries(updated)
+
+    def get(self, club_name: str) -> Optional[Dict[str, Any]]:
+        stored = self._summaries.get(club_name)
+        return stored[1] if stored else None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"clubs": len(self._summaries), "dirty": len(self._dirty), "recomputed": self.recomputed, "reused": self.reused}
+
+CLUB_SUMMARIES = ClubSummaries(SQUAD_STORE, OWNED_ROSTER)
+SQUAD_STORE.listeners.append(CLUB_SUMMARIES.on_clubs_changed)
+OWNED_ROSTER.listeners.append(CLUB_SUMMARIES.on_roster_changed)
+
+# --- Background Jobs ---
+# Long computations (role analysis of a whole roster, formation recommendation, market scans) can
+# run as jobs instead of inside the request: submitting returns 202 with a job id, and the job is
+# polled for progress, partial results and finally its result. JOB_WORKERS jobs run at once; the
+# rest wait in a bounded queue. CPU-bound chunks (scoring.py functions; spawned workers import only
+# that module, never the app and its squad store) go to a process pool with at most JOB_PROCESSES
+# chunks of a job in flight, so jobs interleave fairly. If a worker process dies, the jobs using
+# the pool fail and the next job starts a fresh one. Cancelling stops a job between chunks; a
+# chunk already running in a process finishes and is discarded. Finished jobs are dropped
+# JOB_RESULT_TTL seconds after they end.
+class JobQueueFull(Exception):
+    pass
+
+class Job:
+    def __init__(self, kind: str, run, params: Dict[str, Any]):
+        self.id = secrets.token_hex(8)
+        self.kind = kind
+        self.run = run  # async fn(job) -> result
+        self.params = params
+        self.status = "queued"  # queued, running, cancelling, then succeeded, failed or cancelled
+        self.done = 0
+        self.total: Optional[int] = None
+        self.unit = ""
+        self.partial: List[Any] = []
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def progress(self, done: int, total: Optional[int] = None, unit: Optional[str] = None):
+        self.done = done
+        if total is not None: self.total = total
+        if unit is not None: self.unit = unit
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("succeeded", "failed", "cancelled")
+
+    def view(self, partial: bool = False, result: bool = False) -> Dict[str, Any]:
+        stamp = lambda t: datetime.fromtimestamp(t, timezone.utc).isoformat() if t else None
+        view = {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": {"done": self.done, "total": self.total, "unit": self.unit,
+                         "fraction": round(self.done / self.total, 4) if self.total else (1.0 if self.status == "succeeded" else 0.0)},
+            "params": self.params,
+            "created_at": stamp(self.created_at),
+            "started_at": stamp(self.started_at),
+            "finished_at": stamp(self.finished_at),
+            "expires_at": stamp(self.finished_at + JOB_RESULT_TTL) if self.finished_at else None,
+        }
+        if self.error is not None:
+            view["error"] = self.error
+        if partial and not self.finished:
+            view["partial"] = list(self.partial)
+        if result and self.status == "succeeded":
+            view["result"] = self.result
+        return view
+
+class JobQueue:
+    def __init__(self, workers: int, processes: int, max_queued: int, ttl: float):
+        self.workers = max(1, workers)
+        self.processes = processes
+        self.max_queued = max_queued
+        self.ttl = ttl
+        self._jobs: Dict[str, Job] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _ensure_workers(self):
+        if self._worker_tasks and not any(t.done() for t in self._worker_tasks):
+            return
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        self._worker_tasks = [t for t in self._worker_tasks if not t.done()]
+        self._worker_tasks += [background_task(self._worker()) for _ in range(self.workers - len(self._worker_tasks))]
+
+    def _executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.processes <= 0:
+            return None  # the loop's default thread pool
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.processes, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def _discard_pool(self, pool: Optional[ProcessPoolExecutor]):
+        if pool is not None and pool is self._pool:
+            pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _expire(self):
+        now = time.time()
+        for job_id in [j.id for j in self._jobs.values() if j.finished_at and now - j.finished_at > self.ttl]:
+            del self._jobs[job_id]
+
+    def submit(self, kind: str, run, params: Dict[str, Any]) -> Job:
+        self._expire()
+        self._ensure_workers()
+        if sum(1 for j in self._jobs.values() if j.status == "queued") >= self.max_queued:
+            raise JobQueueFull(f"{self.max_queued} jobs already queued")
+        job = Job(kind, run, params)
+        self._jobs[job.id] = job
+        self._queue.put_nowait(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._expire()
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        self._expire()
+        return sorted(self._jobs.values(), key=lambda j: j.created_at, reverse=True)
+
+    # Cancel a queued or running job; a finished job is discarded along with its result.
+    def cancel(self, job_id: str) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        if job.finished:
+            del self._jobs[job_id]
+        elif job.task is not None:
+            job.status = "cancelling"
+            job.task.cancel()
         else:
-            squad.append({
-                "slot": slot,
-                "assigned_role": role_name,
-                "player_id": None,
-                "player_name": "—",
-                "fit_score": None,
-                "fit_label": "No suitable player"
-            })
-            
-    return {"squad": squad}
+            self._finish(job, "cancelled")
+        return job
+
+    def _finish(self, job: Job, status: str):
+        job.status = status
+        job.finished_at = time.time()
+        job.partial = []
+        JOBS_FINISHED.inc(job.kind, status)
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            if job.status != "queued":
+                continue  # cancelled while waiting
+            job.status, job.started_at = "running", time.time()
+            job.task = background_task(job.run(job))
+            await asyncio.wait({job.task})
+            if job.task.cancelled():
+                self._finish(job, "cancelled")
+            elif job.task.exception() is not None:
+                e = job.task.exception()
+                job.error = {"status_code": e.status_code, "detail": e.detail} if isinstance(e, HTTPException) else {"detail": f"{type(e).__name__}: {e}"}
+                self._finish(job, "failed")
+            else:
+                job.result = job.task.result()
+                self._finish(job, "succeeded")
+            job.task = None
+
+    # Run fn(*args) for every args tuple in `chunks` on the executor, at most JOB_PROCESSES at a
+    # time, yielding (chunk index, result) as they complete.
+    async def map_chunks(self, fn, chunks: List[tuple]):
+        loop = asyncio.get_running_loop()
+        executor = self._executor()
+        window = max(1, self.processes)
+        waiting = list(enumerate(chunks))[::-1]
+        running: Dict[asyncio.Future, int] = {}
+        try:
+            while waiting or running:
+                while waiting and len(running) < window:
+                    index, args = waiting.pop()
+                    running[loop.run_in_executor(executor, fn, *args)] = index
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    yield running.pop(future), future.result()
+        except BrokenProcessPool:
+            self._discard_pool(executor)
+            raise
+        finally:
+            for future in running:
+                future.cancel()
+
+    async def stop(self):
+        for task in self._worker_tasks:
+            task.cancel()
+        for job in self._jobs.values():
+            if job.task is not None:
+                job.task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        self._queue = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> Dict[str, Any]:
+        by_status: Dict[str, int] = {}
+        for job in self._jobs.values():
+            by_status[job.status] = by_status.get(job.status, 0) + 1
+        return {"workers": self.workers, "processes": self.processes, "max_queued": self.max_queued, "ttl_seconds": self.ttl, "jobs": by_status}
+
+JOBS = JobQueue(JOB_WORKERS, JOB_PROCESSES, JOB_QUEUE_MAX, JOB_RESULT_TTL)
+
+class RoleAnalysisJobRequest(BaseModel):
+    player_ids: Optional[List[int]] = None      # default: the whole owned roster
+    tiers: Optional[List[str]] = None
+    roles: Optional[List[str]] = None
+    max_roles_per_tier: Optional[int] = None
+    include_attributes: bool = False
+
+def submit_job(kind: str, run, req: BaseModel) -> JSONResponse:
+    try:
+        job = JOBS.submit(kind, run, req.model_dump(exclude={"auth_token"}))
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=f"Job queue is full: {e}")
+    return TimedJSONResponse(status_code=202, content=job.view(), headers={"Location": f"/jobs/{job.id}"})
+
+@app.post("/jobs/role-analysis")
+async def submit_role_analysis_job(req: RoleAnalysisJobRequest):
+    check_tiers(req.tiers)
+    check_roles(req.roles)
+
+    async def run(job: Job):
+        if req.player_ids is None:
+            players_df = await OWNED_ROSTER.get()
+            records = players_df.drop(columns=["bestTier", "bestRole"], errors="ignore").to_dict("records") if not players_df.empty else []
+            players = {int(p["id"]): p for p in records}
+            player_ids = list(players)
+        else:
+            player_ids = list(dict.fromkeys(req.player_ids))
+            players = await load_analysis_players(player_ids)
+        found = [pid for pid in player_ids if pid in players]
+        chunks = [found[i:i + JOB_CHUNK_SIZE] for i in range(0, len(found), max(1, JOB_CHUNK_SIZE))]
+        job.progress(0, len(found), "players")
+        results: List[Optional[List[Dict[str, Any]]]] = [None] * len(chunks)
+        args = [(SCORING_ENGINE, [players[pid] for pid in ids], req.tiers, req.roles, req.max_roles_per_tier) for ids in chunks]
+        async for index, analyses in JOBS.map_chunks(role_analysis_chunk, args):
+            results[index] = [analysis_entry(pid, analysis, players[pid], req.include_attributes) for pid, analysis in zip(chunks[index], analyses)]
+            job.partial.extend(results[index])
+            job.progress(job.done + len(chunks[index]))
+        return {"players": [entry for chunk in results for entry in chunk], "not_found": [pid for pid in player_ids if pid not in players]}
+
+    return submit_job("role-analysis", run, req)
+
+@app.post("/jobs/formations/recommend")
+async def submit_formation_job(req: FormationRecommendRequest):
+    names = check_formation_request(req)
+
+    async def run(job: Job):
+        job.progress(0, len(names), "formations")
+        roster_players = await formation_players(req)
+        fits = position_fits(roster_players, req.tier, req.roles)
+        players = roster_players[['id', 'firstName', 'lastName']].to_dict("records")
+        per_chunk = max(1, -(-len(names) // max(1, JOBS.processes)))
+        chunks = [names[i:i + per_chunk] for i in range(0, len(names), per_chunk)]
+        results: List[Optional[List[Dict[str, Any]]]] = [None] * len(chunks)
+        args = [([(name, FORMATION_MAPS[name]) for name in chunk], fits, players, req.solver, req.include_squads) for chunk in chunks]
+        async for index, ranked in JOBS.map_chunks(formation_chunk, args):
+            results[index] = ranked
+            job.partial = sorted(job.partial + ranked, key=lambda r: (-r["total_score"], -r["filled_slots"]))
+            job.progress(job.done + len(ranked))
+        return formation_response(req, len(roster_players), [r for chunk in results for r in chunk])
+
+    return submit_job("formations", run, req)
+
+@app.post("/jobs/market/scan")
+async def submit_market_scan_job(req: MarketScanRequest):
+    page_size, max_pages = check_scan_request(req)
+
+    async def run(job: Job):
+        job.progress(0, max_pages, "pages")
+        return await run_market_scan(req, page_size, max_pages, on_page=lambda pages, _: job.progress(pages))
+
+    return submit_job("market-scan", run, req)
+
+@app.get("/jobs")
+async def list_jobs():
+    return {"stats": JOBS.stats(), "jobs": [job.view() for job in JOBS.list()]}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, partial: bool = False):
+    job = JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job.view(partial=partial, result=True)
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    job = JOBS.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job.view()
@@ -0,0 +1,272 @@
+# file: scoring.py
+#
+# Fit scoring, squad assignment and the formation recommender's per-formation step. Pure functions
+# over NumPy/pandas: importing this module has no side effects, so the background job workers
+# (spawned processes) import it instead of the app.
+from contextlib import nullcontext
+from functools import wraps
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import linear_sum_assignment
+
+ROLE_ATTR_FIELDS = ["Attribute1", "Attribute2", "Attribute3", "Attribute4"]
+
+def fit_label(score) -> str:
+    return "Elite" if score >= 50 else "Strong" if score >= 20 else "Natural" if score >= 0 else "Weak" if score >= -20 else "Unusable"
+
+def _no_count(method: str, evaluations: int):
+    pass
+
+def timed_call(method):
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.timer():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+# --- Scoring Engine ---
+# ROLES_DATA, ATTR_MAP, ATTRIBUTE_WEIGHTS and TIER_THRESH are compiled once into arrays so that a
+# whole player matrix is scored against every role and tier in one pass:
+#   raw[n, t, r] = attrs[n] @ coef[r] - offset[t, r]
+# Rows follow ROLES_DATA order (ties resolve exactly like the old per-role loops) but take their
+# definition from ROLE_LOOKUP.
+# The app passes `timer` (a context manager factory wrapped around every scoring call) and
+# `count(method, evaluations)` for its metrics; both are dropped when the engine is pickled into a
+# job worker.
+class ScoringEngine:
+    def __init__(self, roles_data, role_lookup, tier_thresh, attr_map, attribute_weights, role_descriptions, timer=None, count=None):
+        self.timer = timer or nullcontext
+        self.count = count or _no_count
+        self.tiers = list(tier_thresh.keys())
+        self.tier_index = {t: i for i, t in enumerate(self.tiers)}
+        self.attr_columns = list(dict.fromkeys(attr_map.values()))
+        attr_index = {col: i for i, col in enumerate(self.attr_columns)}
+
+        self.role_names = [(r.get("Role") or r.get("RoleType") or "").strip().upper() for r in roles_data]
+        self.role_display_positions = [r.get("Position", "") for r in roles_data]
+        self.role_index = {name: j for j, name in enumerate(self.role_names) if name in role_lookup}
+        self.role_known = np.array([name in role_lookup for name in self.role_names], dtype=bool)
+        self.role_rankable = self.role_known & np.array([bool(name) for name in self.role_names], dtype=bool)
+        self.role_descriptions = [role_descriptions.get(name, "No description available.") for name in self.role_names]
+
+        thresholds = np.array([tier_thresh[t] for t in self.tiers], dtype=float)
+        self.coef = np.zeros((len(self.role_names), len(self.attr_columns)))
+        self.offset = np.zeros((len(self.tiers), len(self.role_names)))
+        need_positions = []
+        for j, name in enumerate(self.role_names):
+            role = role_lookup.get(name) or {}
+            need_positions.append((role.get("Position", "") or "").strip().upper())
+            for i, field in enumerate(ROLE_ATTR_FIELDS):
+                code = (role.get(field) or "").strip().upper()
+                col = attr_map.get(code)
+                if not code or not col: continue
+                self.coef[j, attr_index[col]] += attribute_weights[i]
+                self.offset[:, j] += thresholds[:, i] * attribute_weights[i]
+
+        # Position mask: roles without a required position point at a trailing always-true column.
+        self.positions = sorted({p for p in need_positions if p})
+        self.position_index = {p: i for i, p in enumerate(self.positions)}
+        self.role_position = np.array([self.position_index.get(p, -1) if p else -1 for p in need_positions], dtype=int)
+
+    def __getstate__(self):
+        return {**self.__dict__, "timer": nullcontext, "count": _no_count}
+
+    def tier_row(self, tier: str) -> int:
+        return self.tier_index.get(tier, self.tier_index["Iron"])
+
+    # (attrs[N, A], usable[N, R]) for a DataFrame or a sequence of player dicts/Series.
+    def compile_players(self, players):
+        if isinstance(players, pd.DataFrame):
+            attrs_df = players.reindex(columns=self.attr_columns)
+            positions = players["positions"].tolist() if "positions" in players else [None] * len(players)
+        else:
+            players = [p.to_dict() if isinstance(p, pd.Series) else p for p in players]
+            attrs_df = pd.DataFrame([{col: p.get(col, 0) for col in self.attr_columns} for p in players], columns=self.attr_columns)
+            positions = [p.get("positions") for p in players]
+        attrs = attrs_df.apply(pd.to_numeric, errors="coerce").fillna(0).to_numpy(dtype=float)
+
+        pos_hits = np.zeros((len(positions), len(self.positions) + 1), dtype=bool)
+        pos_hits[:, -1] = True
+        for n, player_positions in enumerate(positions):
+            if not isinstance(player_positions, (list, tuple, set, np.ndarray)): continue
+            for p in player_positions:
+                idx = self.position_index.get((p or "").strip().upper())
+                if idx is not None: pos_hits[n, idx] = True
+        return attrs, pos_hits[:, self.role_position]
+
+    # Untruncated scores, shape (N, T, R); `tiers` selects a subset of tier rows.
+    def raw_scores(self, attrs, tiers=None):
+        offset = self.offset if tiers is None else self.offset[[self.tier_row(t) for t in tiers]]
+        return (attrs @ self.coef.T)[:, None, :] - offset[None, :, :]
+
+    # Fit of every player for one role/tier: (scores, labels, usable) per player; -999 when the role
+    # is unknown or the player's positions do not allow it.
+    @timed_call
+    def fit(self, players, role_name: str, tier: str):
+        attrs, usable = self.compile_players(players)
+        self.count("fit", len(attrs))
+        j = self.role_index.get((role_name or "").strip().upper())
+        if j is None:
+            return np.full(len(attrs), -999, dtype=int), ["Unknown"] * len(attrs), np.zeros(len(attrs), dtype=bool)
+        raw = attrs @ self.coef[j] - self.offset[self.tier_row(tier), j]
+        scores = np.where(usable[:, j], np.trunc(raw), -999).astype(int)
+        labels = [fit_label(s) if ok else "Unusable" for s, ok in zip(raw.tolist(), usable[:, j].tolist())]
+        return scores, labels, usable[:, j]
+
+    # Truncated fit of every player against each requested role at one tier, shape (N, len(role_names));
+    # unknown roles and position mismatches score -999.
+    @timed_call
+    def role_scores(self, players, role_names, tier: str):
+        attrs, usable = self.compile_players(players)
+        self.count("role_scores", len(attrs) * len(role_names))
+        cols = [self.role_index.get((name or "").strip().upper(), -1) for name in role_names]
+        cols_arr = np.array(cols, dtype=int)
+        raw = attrs @ self.coef[cols_arr].T - self.offset[self.tier_row(tier), cols_arr]
+        ok = usable[:, cols_arr] & (cols_arr >= 0)
+        return np.where(ok, np.trunc(raw), -999).astype(int)
+
+    # fit() for several (role, tier) targets in one pass: truncated scores[N, K] (-999 where the role
+    # is unknown or the player's positions do not allow it) and the untruncated raw[N, K] for labels.
+    @timed_call
+    def fit_many(self, players, role_names, tiers):
+        attrs, usable = self.compile_players(players)
+        self.count("fit_many", len(attrs) * len(role_names))
+        cols = np.array([self.role_index.get((name or "").strip().upper(), -1) for name in role_names], dtype=int)
+        rows = np.array([self.tier_row(t) for t in tiers], dtype=int)
+        raw = attrs @ self.coef[cols].T - self.offset[rows, cols]
+        ok = usable[:, cols] & (cols >= 0)
+        return np.where(ok, np.trunc(raw), -999).astype(int), raw
+
+    # Strongest tier where some usable role scores >= 0, and the first top-scoring role in it.
+    @timed_call
+    def best_fit(self, players) -> pd.DataFrame:
+        attrs, usable = self.compile_players(players)
+        self.count("best_fit", len(attrs) * len(self.tiers) * len(self.role_names))
+        scores = np.trunc(self.raw_scores(attrs))
+        eligible = (usable & self.role_rankable)[:, None, :]
+        scores = np.where(eligible, scores, -np.inf)
+        best_role = scores.argmax(axis=2)
+        has_fit = scores.max(axis=2) >= 0
+        first_tier = has_fit.argmax(axis=1)
+        rows = []
+        for n in range(len(attrs)):
+            if has_fit[n].any():
+                t = first_tier[n]
+                rows.append((self.tiers[t], self.role_names[best_role[n, t]]))
+            else:
+                rows.append(("Unrated", "N/A"))
+        index = players.index if isinstance(players, pd.DataFrame) else None
+        return pd.DataFrame(rows, columns=["bestTier", "bestRole"], index=index)
+
+    # Per player: (overall_best_role, all_positive_roles_by_tier) as served by /role-analysis.
+    # `tiers` and `roles` narrow what is scored and returned; `limit` caps the roles kept per tier.
+    @timed_call
+    def role_analysis(self, players, tiers: Optional[List[str]] = None, roles: Optional[List[str]] = None, limit: Optional[int] = None):
+        attrs, usable = self.compile_players(players)
+        tier_names = self.tiers if tiers is None else [t for t in self.tiers if t in set(tiers)]
+        self.count("role_analysis", len(attrs) * len(tier_names) * len(self.role_names))
+        raw = self.raw_scores(attrs, tier_names)
+        scores = np.trunc(raw)
+        role_filter = self.role_known
+        if roles is not None:
+            wanted = {(r or "").strip().upper() for r in roles}
+            role_filter = role_filter & np.array([name in wanted for name in self.role_names], dtype=bool)
+        results = []
+        for n in range(len(attrs)):
+            keep = usable[n] & role_filter
+            by_tier, overall_best = {}, None
+            for t, tier_name in enumerate(tier_names):
+                selected = np.flatnonzero(keep & (scores[n, t] >= 0))
+                if not len(selected): continue
+                order = selected[np.argsort(-scores[n, t, selected], kind="stable")][:limit]
+                by_tier[tier_name] = [{
+                    "role": self.role_names[j],
+                    "score": int(scores[n, t, j]),
+                    "label": fit_label(raw[n, t, j]),
+                    "description": self.role_descriptions[j],
+                    "position": self.role_display_positions[j],
+                    "tier": tier_name
+                } for j in order]
+                if overall_best is None:
+                    overall_best = by_tier[tier_name][0]
+            results.append((overall_best, by_tier))
+        return results
+
+# --- Squad Assignment ---
+# Both solvers take a (players x slots) fit matrix and return, per slot, the row of the chosen
+# player or -1. Only fits >= 0 count as an assignment.
+def greedy_assignment(scores: np.ndarray) -> List[int]:
+    available = np.ones(scores.shape[0], dtype=bool)
+    chosen = []
+    for k in range(scores.shape[1]):
+        # Best remaining player for the slot, first one wins ties
+        slot_scores = np.where(available, scores[:, k], -1)
+        best = int(slot_scores.argmax()) if len(slot_scores) else -1
+        if best >= 0 and slot_scores[best] >= 0:
+            available[best] = False
+            chosen.append(best)
+        else:
+            chosen.append(-1)
+    return chosen
+
+def optimal_assignment(scores: np.ndarray) -> List[int]:
+    chosen = [-1] * scores.shape[1]
+    if not scores.size:
+        return chosen
+    # Maximise total fit; among equal totals prefer filling more slots. Ineligible pairs weigh 0
+    # and are dropped after solving.
+    eligible = scores >= 0
+    weights = np.where(eligible, scores.astype(np.int64) * (scores.shape[1] + 1) + 1, 0)
+    rows, cols = linear_sum_assignment(weights, maximize=True)
+    for row, col in zip(rows, cols):
+        if eligible[row, col]:
+            chosen[col] = int(row)
+    return chosen
+
+def assignment_total(scores: np.ndarray, chosen: List[int]) -> int:
+    return int(sum(scores[row, k] for k, row in enumerate(chosen) if row >= 0))
+
+def squad_slot(slot: str, role_name: str, player=None, fit_score: Optional[int] = None) -> Dict[str, Any]:
+    if player is None:
+        return {"slot": slot, "assigned_role": role_name, "player_id": None, "player_name": "—", "fit_score": None, "fit_label": "No suitable player"}
+    return {
+        "slot": slot,
+        "assigned_role": role_name,
+        "player_id": int(player['id']),
+        "player_name": f"{player['firstName']} {player['lastName']}",
+        "fit_score": fit_score,
+        "fit_label": fit_label(fit_score)
+    }
+
+# --- Formation Recommender ---
+# `players` are the roster rows (id and names) in the row order of `fits`.
+def recommend_formation(name: str, formation: Dict[str, str], fits: Dict[str, tuple], players: List[Dict[str, Any]], solver: str, include_squad: bool) -> Dict[str, Any]:
+    slots = list(formation.items())
+    n = len(players)
+    missing = (np.full(n, -999, dtype=int), np.full(n, None, dtype=object))
+    columns = [fits.get((position or "").strip().upper(), missing) for _, position in slots]
+    scores = np.column_stack([c[0] for c in columns]) if n else np.zeros((0, len(slots)), dtype=int)
+    chosen = optimal_assignment(scores) if solver == "optimal" else greedy_assignment(scores)
+    result = {
+        "formation": name,
+        "total_score": assignment_total(scores, chosen),
+        "filled_slots": sum(1 for row in chosen if row >= 0),
+        "slots": len(slots),
+    }
+    if include_squad:
+        result["squad"] = [
+            {**squad_slot(slot, columns[k][1][row], players[row], int(scores[row, k])), "position": position} if row >= 0
+            else {**squad_slot(slot, None), "position": position}
+            for k, ((slot, position), row) in enumerate(zip(slots, chosen))
+        ]
+    return result
+
+# --- Job Chunks ---
+# Run in the job pool processes, which only ever import this module.
+def role_analysis_chunk(engine: ScoringEngine, players: List[Dict[str, Any]], tiers, roles, limit):
+    return engine.role_analysis(players, tiers=tiers, roles=roles, limit=limit)
+
+def formation_chunk(formations: List[tuple], fits: Dict[str, tuple], players: List[Dict[str, Any]], solver: str, include_squads: bool):
+    return [recommend_formation(name, formation, fits, players, solver, include_squads) for name, formation in formations]